@@ -0,0 +1,104 @@
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+import pandas as pd
+
+from sql_guard import SQLGuard, UnsafeQuery
+
+_guard = SQLGuard()
+
+
+def sql_key(sql: str) -> str:
+    """Text that is equal for queries that would return the same rows"""
+    try:
+        return _guard.parse(sql).text
+    except UnsafeQuery:
+        return re.sub(r'\s+', ' ', sql).strip().rstrip(';')
+
+
+def run_batch(questions: List[str],
+              to_sql: Callable[[str], str],
+              execute: Callable[[str], pd.DataFrame],
+              summarize: Callable[[str, str, pd.DataFrame], str],
+              max_concurrency: int = 4) -> List[Dict[str, Any]]:
+    """Answer many questions, doing shared work once.
+
+    Identical questions are answered once, ``to_sql`` and ``summarize`` (the
+    LLM calls) run on up to ``max_concurrency`` threads, and each distinct
+    SQL statement is executed once however many questions produced it.
+    Results come back in input order, shaped like ``analyze`` results plus a
+    ``timings`` dict (seconds per stage).
+    """
+    unique = list(dict.fromkeys(questions))
+    state = {q: {'timings': {}} for q in unique}
+
+    def timed(question, stage, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            state[question]['timings'][stage] = round(time.perf_counter() - start, 4)
+
+    def generate(question):
+        try:
+            state[question]['sql_query'] = timed(question, 'sql_generation', to_sql, question)
+        except Exception as e:
+            state[question]['error'] = str(e)
+
+    def run(sql):
+        start = time.perf_counter()
+        try:
+            return execute(sql), None, time.perf_counter() - start
+        except Exception as e:
+            return None, str(e), time.perf_counter() - start
+
+    def explain(question):
+        entry = state[question]
+        if 'error' in entry:
+            return
+        try:
+            entry['insights'] = timed(question, 'insights', summarize, question, entry['sql_query'], entry['results'])
+        except Exception as e:
+            entry['error'] = str(e)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as pool:
+        list(pool.map(generate, unique))
+
+        by_sql = {}
+        for question in unique:
+            if 'sql_query' in state[question]:
+                by_sql.setdefault(sql_key(state[question]['sql_query']), []).append(question)
+        runs = dict(zip(by_sql, pool.map(run, [state[group[0]]['sql_query'] for group in by_sql.values()])))
+        for key, group in by_sql.items():
+            results, error, seconds = runs[key]
+            for question in group:
+                entry = state[question]
+                entry['timings']['execution'] = round(seconds, 4)
+                entry['shared_execution'] = len(group) > 1
+                if error is None:
+                    entry['results'] = results
+                else:
+                    entry['error'] = error
+
+        list(pool.map(explain, unique))
+
+    answers = {}
+    for question in unique:
+        entry = state[question]
+        timings = entry['timings']
+        timings['total'] = round(sum(timings.values()), 4)
+        if 'error' in entry:
+            answers[question] = {'question': question, 'error': entry['error'], 'success': False, 'timings': timings}
+        else:
+            answers[question] = {
+                'question': question,
+                'sql_query': entry['sql_query'],
+                'results': entry['results'].to_dict('records'),
+                'insights': entry['insights'],
+                'success': True,
+                'shared_execution': entry['shared_execution'],
+                'timings': timings
+            }
+    return [dict(answers[question]) for question in questions]
@@ -0,0 +1,192 @@
+"""End-to-end benchmark of the analyst classes against a local mock Ollama.
+
+Loads the bundled datasets, times the nl_to_sql / execute_query /
+insight stages per question, measures analyze() throughput under
+concurrency and the peak RSS of each class (run in its own process), and
+writes everything to JSON so runs can be compared over time.
+
+    python benchmark.py --latency 0.2 --concurrency 4 --output benchmark_results.json
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import inspect
+import importlib
+import statistics
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from mock_ollama import MockOllama
+from example_store import ExampleStore
+
+ANALYSTS = [
+    'data_analyst:DataAnalystAssistant',
+    'data_analyst_optimized:DataAnalystAssistant',
+    'optimized_analyst:OptimizedDataAnalyst',
+    'data_analyst_mysql:DataAnalystAssistant',
+]
+
+# file, table, [(question, SQL the mock returns for it)]
+DATASETS = [
+    ('BMW_sales.csv', 'bmw_sales', [
+        ("total sales volume by region", "SELECT Region, SUM(Sales_Volume) AS total FROM bmw_sales GROUP BY Region;"),
+        ("top 10 most expensive models", "SELECT Model, Price_USD FROM bmw_sales ORDER BY Price_USD DESC LIMIT 10;"),
+    ]),
+    ('Netflix_Dataset.csv', 'netflix_dataset', [
+        ("how many titles are in each category", "SELECT Category, COUNT(*) AS titles FROM netflix_dataset GROUP BY Category;"),
+    ]),
+    ('Salary_Data.csv', 'salary_data', [
+        ("average salary by gender", "SELECT Gender, AVG(Salary) AS avg_salary FROM salary_data GROUP BY Gender;"),
+    ]),
+    ('Financials.csv', 'financials', [
+        ("number of records per segment and year", "SELECT Segment, Year, COUNT(*) AS records FROM financials GROUP BY Segment, Year;"),
+    ]),
+]
+
+
+def mock_script() -> List[tuple]:
+    """SQL prompts (schema first, then the question) get the scripted SQL; everything else gets prose.
+
+    Prompts asking for a JSON object with a "sql" key get the structured form.
+    """
+    script = []
+    for _, table, questions in DATASETS:
+        for question, sql in questions:
+            structured = json.dumps({'sql': sql, 'tables_used': [table], 'confidence': 0.9})
+            script.append((rf"columns.*{re.escape(question)}.*\"sql\"", structured))
+            script.append((rf"columns.*{re.escape(question)}", sql))
+    return script
+
+
+def load_class(spec: str):
+    module, name = spec.split(':')
+    return getattr(importlib.import_module(module), name)
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    return {
+        'count': len(ordered),
+        'mean': round(statistics.mean(ordered), 4),
+        'p50': round(ordered[len(ordered) // 2], 4),
+        'p95': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 4),
+        'max': round(ordered[-1], 4),
+    }
+
+
+def insights(analyst, question: str, sql: str, results) -> str:
+    if hasattr(analyst, 'generate_insights'):
+        return analyst.generate_insights(question, sql, results)
+    return analyst.generate_simple_insights(question, results)
+
+
+def bench_class(spec: str, ollama_url: str, data_dir: str, repeat: int, concurrency: int) -> Dict[str, Any]:
+    """Benchmark one analyst class; meant to run in a fresh process so RSS is its own"""
+    cls = load_class(spec)
+    # Keep runs hermetic: no examples accepted in earlier sessions leak into the prompts
+    stores = {'example_store': ExampleStore(':memory:')}
+    analyst = cls(ollama_url, **{name: store for name, store in stores.items()
+                                 if name in inspect.signature(cls).parameters})
+    report = {'load_seconds': {}, 'stages': {}, 'throughput': {}, 'errors': []}
+
+    for file_name, table, _ in DATASETS:
+        start = time.perf_counter()
+        analyst.load_file(os.path.join(data_dir, file_name), table)
+        report['load_seconds'][table] = round(time.perf_counter() - start, 4)
+
+    questions = [question for _, _, pairs in DATASETS for question, _ in pairs]
+    stages = {'nl_to_sql': [], 'execute_query': [], 'insights': []}
+    for _ in range(repeat):
+        for question in questions:
+            try:
+                start = time.perf_counter()
+                sql = analyst.nl_to_sql(question)
+                stages['nl_to_sql'].append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                results = analyst.execute_query(sql)
+                stages['execute_query'].append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                insights(analyst, question, sql, results)
+                stages['insights'].append(time.perf_counter() - start)
+            except Exception as e:
+                report['errors'].append(f"{question}: {e}")
+    report['stages'] = {name: summarize(samples) for name, samples in stages.items()}
+
+    workload = questions * repeat
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(analyst.analyze, workload))
+    elapsed = time.perf_counter() - start
+    report['throughput'] = {
+        'concurrency': concurrency,
+        'questions': len(workload),
+        'failed': sum(1 for outcome in outcomes if not outcome.get('success')),
+        'seconds': round(elapsed, 4),
+        'questions_per_second': round(len(workload) / elapsed, 3) if elapsed else None,
+    }
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    report['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20, 1)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--latency', type=float, default=0.05, help="mock LLM latency per call, seconds")
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3, help="passes over the question set")
+    parser.add_argument('--analysts', nargs='*', default=ANALYSTS, help="module:Class specs to benchmark")
+    parser.add_argument('--data-dir', default=os.path.dirname(os.path.abspath(__file__)))
+    parser.add_argument('--output', default='benchmark_results.json')
+    args = parser.parse_args()
+
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    with MockOllama(latency=args.latency, script=mock_script(), default="The results answer the question.") as mock:
+        for spec in args.analysts:
+            print(f"Benchmarking {spec}...")
+            with context.Pool(1) as pool:
+                try:
+                    results[spec] = pool.apply(bench_class, (spec, mock.url, args.data_dir, args.repeat, args.concurrency))
+                except Exception as e:
+                    results[spec] = {'error': str(e)}
+        llm_calls = len(mock.requests)
+
+    output = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {
+            'latency': args.latency,
+            'concurrency': args.concurrency,
+            'repeat': args.repeat,
+            'datasets': [file_name for file_name, _, _ in DATASETS],
+        },
+        'llm_calls': llm_calls,
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+
+    for spec, report in results.items():
+        if 'error' in report:
+            print(f"{spec}: ERROR {report['error']}")
+            continue
+        stages = ', '.join(f"{name} {stats.get('mean', 0) * 1000:.1f}ms" for name, stats in report['stages'].items())
+        print(f"{spec}: {stages}; {report['throughput']['questions_per_second']} q/s; "
+              f"peak RSS {report['peak_rss_mb']} MB; {len(report['errors'])} errors")
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,16 @@
 import pandas as pd
-import sqlite3
-import requests
-from typing import Dict, Any
+from typing import Dict, Any, List
 import os
 import json
+from sqlite_pool import SQLiteConnectionManager
+from batch_analysis import run_batch
+from model_router import ModelRouter
 
 class DataAnalystAssistant:
-    def __init__(self, ollama_url: str = "http://localhost:11434"):
+    def __init__(self, ollama_url: str = "http://localhost:11434", router: ModelRouter = None):
         self.ollama_url = ollama_url
-        self.db_connection = sqlite3.connect(':memory:', check_same_thread=False)
+        self.router = router or ModelRouter(ollama_url)
+        self.db = SQLiteConnectionManager()
         self.tables = {}
         
     def load_file(self, file_path: str, table_name: str = None) -> str:
@@ -21,7 +23,8 @@ class DataAnalystAssistant:
         else:
             df = pd.read_excel(file_path)
             
-        df.to_sql(table_name, self.db_connection, if_exists='replace', index=False)
+        with self.db.writer() as connection:
+            df.to_sql(table_name, connection, if_exists='replace', index=False)
         
         # Store table schema
         self.tables[table_name] = {
@@ -44,9 +47,9 @@ class DataAnalystAssistant:
             context += f"Sample data: {json.dumps(info['sample_data'][:2], indent=2)}\n"
         return context
     
-    def nl_to_sql(self, question: str) -> str:
+    def nl_to_sql(self, question: str, schema: str = None) -> str:
         """Convert natural language question to SQL query"""
-        schema = self.get_schema_context()
+        schema = schema or self.get_schema_context()
         table_names = list(self.tables.keys())
         
         if not table_names:
@@ -66,23 +69,12 @@ STRICT RULES:
 
 SQL:"""
         
-        # Try SQLCoder first, fallback to Llama3
-        for model in ["sqlcoder", "llama3"]:
-            try:
-                response = requests.post(f"{self.ollama_url}/api/generate", json={
-                    "model": model,
-                    "prompt": prompt,
-                    "stream": False
-                })
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    if result and "response" in result and result["response"]:
-                        sql = result["response"].strip()
-                        sql = sql.replace('```sql', '').replace('```', '').strip()
-                        return sql
-            except Exception:
-                continue
+        # Router orders the sqlcoder -> llama3 chain by observed latency, health and warm model
+        result = self.router.generate('sql', prompt)
+        if result:
+            sql = result["response"].strip()
+            sql = sql.replace('```sql', '').replace('```', '').strip()
+            return sql
         
         # Fallback: generate simple query
         return f"SELECT * FROM {table_names[0]} LIMIT 10"
@@ -90,7 +82,7 @@ SQL:"""
     def execute_query(self, sql_query: str) -> pd.DataFrame:
         """Execute SQL query and return results"""
         try:
-            return pd.read_sql_query(sql_query, self.db_connection)
+            return pd.read_sql_query(sql_query, self.db.reader())
         except Exception as e:
             if "no such table" in str(e).lower():
                 available = list(self.tables.keys())
@@ -112,13 +104,10 @@ Focus on key insights and numbers. Keep it under 100 words.
 
 Answer:"""
         
-        response = requests.post(f"{self.ollama_url}/api/generate", json={
-            "model": "llama3",
-            "prompt": prompt,
-            "stream": False
-        })
-        
-        return response.json()["response"].strip()
+        result = self.router.generate('insights', prompt)
+        if not result:
+            raise Exception("No model available to generate insights. Is Ollama running?")
+        return result["response"].strip()
     
     def analyze(self, question: str) -> Dict[str, Any]:
         """Main analysis pipeline"""
@@ -147,6 +136,17 @@ Answer:"""
                 'success': False
             }
 
+    def analyze_batch(self, questions: List[str], max_concurrency: int = 4) -> List[Dict[str, Any]]:
+        """Analyze many questions at once; see ``batch_analysis.run_batch``"""
+        schema = self.get_schema_context()
+        return run_batch(
+            questions,
+            lambda question: self.nl_to_sql(question, schema),
+            self.execute_query,
+            self.generate_insights,
+            max_concurrency
+        )
+
 # Example usage
 if __name__ == "__main__":
     # Initialize assistant (make sure Ollama is running)
@@ -1,29 +1,105 @@
 import pandas as pd
-import mysql.connector
-import requests
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, Optional, List, Callable
 import os
 import json
 import re
-from sqlalchemy import create_engine
+import time
+import uuid
+import weakref
+import language_id
+from value_index import ValueIndex
+from translation_memory import TranslationMemory
+from model_router import ModelRouter
+from sql_guard import SQLGuard, tables_in_sql
+from follow_up import is_follow_up, parse_refinement, refine_sql, refine_frame
+from example_store import ExampleStore, table_signature
+from query_governor import QueryGovernor, QueryCancelled
+from result_stream import StreamedResult
+from incremental_load import TableDelta, fingerprint, diff_table
+from ingest import parse_uploads
+from file_reader import read_source, source_name, source_buffer
+from excel_reader import read_workbook
+from tracing import Trace, OTLPExporter, record, record_llm
+from metrics import QUESTIONS, LLM_CALLS, LLM_TOKENS, SQL_FALLBACKS, CACHE_REQUESTS, QUERY_SECONDS, STAGE_SECONDS, TABLE_BYTES
+from table_store import SharedTableStore, content_digest
+from sqlite_pool import SQLiteConnectionManager
+from sqlalchemy import create_engine, event
 from urllib.parse import quote_plus
 
+
+def drop_table_gauges(session_id: str, tables: Dict[str, Any]):
+    for table_name in list(tables):
+        TABLE_BYTES.remove(session=session_id, table=table_name)
+
+
 class DataAnalystAssistant:
-    def __init__(self, ollama_url: str = "http://localhost:11434", mysql_config: Dict = None):
+    # SQLAlchemy pool settings for MySQL; override any of them with pool_config
+    DEFAULT_POOL_CONFIG = {
+        'pool_size': 5,
+        'max_overflow': 10,
+        'pool_timeout': 30,
+        'pool_recycle': 1800,    # below MySQL's wait_timeout, avoids "server has gone away"
+        'pool_pre_ping': True,
+    }
+    
+    # Ollama structured outputs: the model can only emit objects of this shape
+    SQL_RESPONSE_SCHEMA = {
+        'type': 'object',
+        'properties': {
+            'sql': {'type': 'string'},
+            'tables_used': {'type': 'array', 'items': {'type': 'string'}},
+            'confidence': {'type': 'number'},
+        },
+        'required': ['sql', 'tables_used', 'confidence'],
+    }
+    MULTILINGUAL_SQL_SCHEMA = {
+        'type': 'object',
+        'properties': {
+            'language': {'type': 'string'},
+            'english_question': {'type': 'string'},
+            'sql': {'type': 'string'},
+        },
+        'required': ['language', 'english_question', 'sql'],
+    }
+    
+    def __init__(self, ollama_url: str = "http://localhost:11434", mysql_config: Dict = None,
+                 table_store: SharedTableStore = None, pool_config: Dict = None,
+                 trace_exporter: OTLPExporter = None, translation_memory: TranslationMemory = None,
+                 combined_multilingual: bool = False, router: ModelRouter = None,
+                 example_store: ExampleStore = None):
         self.ollama_url = ollama_url
         self.mysql_config = mysql_config
-        self.db_connection = None
+        self.pool_config = {**self.DEFAULT_POOL_CONFIG, **(pool_config or {})}
+        self.pool_events = {'connects': 0, 'checkouts': 0, 'invalidations': 0}
         self.engine = None
+        self.sqlite_db = None
         self.tables = {}
+        self.session_id = uuid.uuid4().hex[:12]     # tells apart sessions' same-named tables in metrics
+        # Sessions that end without close() (a closed browser tab) still drop their gauges
+        weakref.finalize(self, drop_table_gauges, self.session_id, self.tables)
+        self.value_index = ValueIndex()
+        self.sql_guard = SQLGuard()
+        self.governor = QueryGovernor()
+        self.table_store = table_store or SharedTableStore()
+        self.stream_chunksize = 5000
+        self.max_result_rows = 10000     # rows kept for the results table
+        self.chart_sample_rows = 2000    # rows sampled across the full result for charts
+        self.plan_refresh_ratio = 0.1    # incremental loads changing more rows than this drop cached plans
+        self.trace_exporter = trace_exporter or OTLPExporter.from_env()
+        self.keep_alive = os.environ.get('ANALYST_KEEP_ALIVE', '30m')   # model residency in Ollama after each call
+        self.router = router or ModelRouter(ollama_url, keep_alive=self.keep_alive)
+        self.language_confidence = 0.9   # certainty that a question is not English before it gets translated
+        self.translation_memory = translation_memory if translation_memory is not None else TranslationMemory(':memory:')
+        self.combined_multilingual = combined_multilingual   # 2 LLM calls per non-English question instead of 4-5
+        self.examples = example_store if example_store is not None else ExampleStore()
+        self.example_count = 3
         
         if mysql_config:
             self.connect_mysql()
     
     def connect_mysql(self):
         try:
-            self.db_connection = mysql.connector.connect(**self.mysql_config)
-            
-            # Create SQLAlchemy engine for pandas
+            # One pooled SQLAlchemy engine serves discovery, loads and queries
             user = quote_plus(str(self.mysql_config['user']))
             password = quote_plus(str(self.mysql_config['password']))
             host = self.mysql_config['host']
@@ -31,7 +107,18 @@ class DataAnalystAssistant:
             database = self.mysql_config['database']
             
             connection_string = f"mysql+mysqlconnector://{user}:{password}@{host}:{port}/{database}"
-            self.engine = create_engine(connection_string)
+            self.engine = create_engine(connection_string, **self.pool_config)
+            
+            def count(name):
+                def listener(*args):
+                    self.pool_events[name] += 1
+                return listener
+            event.listen(self.engine, 'connect', count('connects'))
+            event.listen(self.engine, 'checkout', count('checkouts'))
+            event.listen(self.engine, 'invalidate', count('invalidations'))
+            
+            with self.engine.connect() as connection:
+                connection.exec_driver_sql("SELECT 1")
             
             self.load_existing_tables()
             return "Connected to MySQL successfully!"
@@ -40,54 +127,248 @@ class DataAnalystAssistant:
     
     def load_existing_tables(self):
         try:
-            cursor = self.db_connection.cursor()
-            cursor.execute("SHOW TABLES")
-            tables = cursor.fetchall()
-            
-            for (table_name,) in tables:
-                cursor.execute(f"DESCRIBE `{table_name}`")
-                columns_info = cursor.fetchall()
-                columns = [col[0] for col in columns_info]
-                
-                cursor.execute(f"SELECT * FROM `{table_name}` LIMIT 3")
-                sample_rows = cursor.fetchall()
-                sample_data = [dict(zip(columns, row)) for row in sample_rows]
-                
-                self.tables[table_name] = {
-                    'columns': columns,
-                    'sample_data': sample_data
-                }
-            
-            cursor.close()
+            with self.engine.connect() as connection:
+                self._discover_tables(connection)
         except Exception as e:
             print(f"Error loading existing tables: {e}")
     
-    def load_file(self, file_path: str, table_name: str = None) -> str:
+    def _discover_tables(self, connection):
+        tables = connection.exec_driver_sql("SHOW TABLES").fetchall()
+        
+        for (table_name,) in tables:
+            columns_info = connection.exec_driver_sql(f"DESCRIBE `{table_name}`").fetchall()
+            columns = [col[0] for col in columns_info]
+            
+            sample_rows = connection.exec_driver_sql(f"SELECT * FROM `{table_name}` LIMIT 3").fetchall()
+            sample_data = [dict(zip(columns, row)) for row in sample_rows]
+            
+            # Index low-cardinality text columns; LIMIT stops early on high-cardinality ones
+            self.value_index.remove_table(table_name)
+            limit = self.value_index.max_distinct
+            for col in columns_info:
+                col_type = str(col[1]).lower()
+                if not any(t in col_type for t in ('char', 'text', 'enum')):
+                    continue
+                values = [row[0] for row in connection.exec_driver_sql(
+                    f"SELECT DISTINCT `{col[0]}` FROM `{table_name}` WHERE `{col[0]}` IS NOT NULL LIMIT {limit + 1}")]
+                if 0 < len(values) <= limit:
+                    self.value_index.add_column(table_name, col[0], values)
+            
+            self.tables[table_name] = {
+                'columns': columns,
+                'sample_data': sample_data
+            }
+            TABLE_BYTES.remove(session=self.session_id, table=table_name)   # lives in MySQL now
+    
+    def load_file(self, file_path, table_name: str = None, incremental: bool = False, key: str = None,
+                  file_name: str = None, sheet=0, columns: List[str] = None) -> str:
+        """Load a CSV/Excel file into ``table_name``.
+        
+        ``file_path`` may also be a file-like object (a Streamlit upload) or a
+        buffer (``file.getbuffer()``, with ``file_name`` naming the format),
+        which is parsed in memory without a copy on disk. ``sheet`` picks the
+        worksheet of a workbook and ``columns`` limits the columns read.
+        
+        With ``incremental``, reloading a table this assistant loaded before
+        writes only the delta: appended rows, or with a ``key`` column the
+        inserted, changed and removed rows. Otherwise the table is replaced.
+        """
+        file_name = file_name or source_name(file_path)
         if not table_name:
-            table_name = os.path.splitext(os.path.basename(file_path))[0].lower()
+            if not file_name:
+                raise Exception("A table name or file name is needed to load a buffer")
+            table_name = os.path.splitext(file_name)[0].lower()
         
-        if file_path.endswith('.csv'):
-            df = pd.read_csv(file_path)
-        else:
-            df = pd.read_excel(file_path)
+        df = read_source(file_path, file_name, sheet, columns)
+        if key is not None and key not in df.columns:
+            raise Exception(f"Key column '{key}' not found in {file_name}")
+        
+        previous = self.tables.get(table_name, {}).get('fingerprint') if incremental else None
+        if previous:
+            delta = diff_table(previous, df, key)
+            if not delta.replace:
+                return self.apply_delta(table_name, df, delta, key)
         
         # If MySQL connected, use it; otherwise use in-memory SQLite
         if self.engine:
             df.to_sql(table_name, self.engine, if_exists='replace', index=False)
             storage = "MySQL"
         else:
-            import sqlite3
-            if not hasattr(self, 'sqlite_conn'):
-                self.sqlite_conn = sqlite3.connect(':memory:', check_same_thread=False)
-            df.to_sql(table_name, self.sqlite_conn, if_exists='replace', index=False)
-            storage = "in-memory SQLite"
+            database = self.get_sqlite_db()
+            quoted = '"' + table_name.replace('"', '""') + '"'
+            database.add_setup(lambda connection: connection.execute(f"DROP VIEW IF EXISTS temp.{quoted}"))
+            with database.writer() as connection:
+                df.to_sql(table_name, connection, if_exists='replace', index=False)
+                if key is not None:
+                    # Incremental reloads delete changed rows by key
+                    index = '"' + f"ix_{table_name}_{key}".replace('"', '""') + '"'
+                    connection.execute(f'CREATE INDEX {index} ON {quoted} ("{key.replace(chr(34), chr(34) * 2)}")')
+            storage = "SQLite"
         
+        self.register_table(table_name, df, key)
+        return f"Loaded {len(df)} rows into {storage} table '{table_name}'"
+    
+    def register_table(self, table_name: str, df: pd.DataFrame, key: str = None):
+        """Schema, sample, value index and load fingerprint for a freshly written table"""
+        self.value_index.add_table(table_name, df)
+        self.sql_guard.clear_plans()
+        TABLE_BYTES.set(int(df.memory_usage(deep=True).sum()), session=self.session_id, table=table_name)
         self.tables[table_name] = {
             'columns': list(df.columns),
-            'sample_data': df.head(3).to_dict('records')
+            'sample_data': df.head(3).to_dict('records'),
+            'row_count': len(df),
+            'fingerprint': fingerprint(df, key)
         }
+    
+    def load_uploads(self, uploads: List[tuple], max_workers: int = None,
+                     progress: Callable[[str, bool, str], None] = None) -> Dict[str, tuple]:
+        """Load several uploaded files at once: parsed concurrently, registered together.
         
-        return f"Loaded {len(df)} rows into {storage} table '{table_name}'"
+        ``uploads`` are (file name, content, table name[, sheet, columns]),
+        the content as bytes or a buffer such as ``file.getbuffer()``, so
+        nothing goes through disk; ``sheet`` and ``columns`` are as in
+        ``load_file``. ``progress(table_name, ok, message)`` is called as each
+        file is parsed. Returns table name -> (ok, message); files that fail
+        are reported and the rest still load.
+        """
+        seen = set()
+        for _, _, table_name, *_ in uploads:
+            if table_name in seen:
+                raise Exception(f"Table name '{table_name}' is used by more than one file")
+            seen.add(table_name)
+        outcomes = {}
+        
+        def report(table_name, ok, message):
+            outcomes[table_name] = (ok, message)
+            if progress:
+                progress(table_name, ok, message)
+        
+        if self.engine:
+            to_parse = list(range(len(uploads)))
+        else:
+            # The shared store already holds files any session has loaded; hash each upload once
+            digests = [content_digest(data) for _, data, *_ in uploads]
+            variants = [self.dataset_variant(*options) for _, _, _, *options in uploads]
+            to_parse = [i for i, (_, data, *_) in enumerate(uploads)
+                        if not self.table_store.contains(data, variants[i], digests[i])]
+        frames = {}
+        parse = [(file_name, data, *options) for file_name, data, _, *options in (uploads[i] for i in to_parse)]
+        for position, parsed in parse_uploads(parse, max_workers):
+            file_name, _, table_name, *_ = uploads[to_parse[position]]
+            if isinstance(parsed, Exception):
+                report(table_name, False, f"Error loading {file_name}: {parsed}")
+            else:
+                frames[to_parse[position]] = parsed
+                report(table_name, True, f"Parsed {len(parsed)} rows from {file_name}")
+        
+        if self.engine:
+            tables = {uploads[i][2]: df for i, df in frames.items()}
+            if tables:
+                self.replace_mysql_tables(tables)
+            for table_name, df in tables.items():
+                self.register_table(table_name, df)
+                outcomes[table_name] = (True, f"Loaded {len(df)} rows into MySQL table '{table_name}'")
+        else:
+            pairs = [(self.table_store.get_or_load(data, file_name, frames.get(i), variants[i], digests[i]), table_name)
+                     for i, (file_name, data, table_name, *_) in enumerate(uploads)
+                     if i in frames or i not in to_parse]
+            for (_, table_name), message in zip(pairs, self.attach_datasets(pairs)):
+                outcomes[table_name] = (True, message)
+        return outcomes
+    
+    def replace_mysql_tables(self, tables: Dict[str, pd.DataFrame]):
+        """Write each frame to a staging table, then swap them all in with one atomic RENAME TABLE"""
+        staged = {}
+        try:
+            for table_name, df in tables.items():
+                staged[table_name] = f"{table_name}__loading"
+                df.to_sql(staged[table_name], self.engine, if_exists='replace', index=False)
+            
+            with self.engine.begin() as connection:
+                existing = {name for (name,) in connection.exec_driver_sql("SHOW TABLES")}
+                renames, replaced = [], []
+                for table_name, staging in staged.items():
+                    if table_name in existing:
+                        replaced.append(f"`{table_name}__replaced`")
+                        renames.append(f"`{table_name}` TO `{table_name}__replaced`")
+                    renames.append(f"`{staging}` TO `{table_name}`")
+                if replaced:
+                    connection.exec_driver_sql(f"DROP TABLE IF EXISTS {', '.join(replaced)}")
+                connection.exec_driver_sql(f"RENAME TABLE {', '.join(renames)}")
+                if replaced:
+                    connection.exec_driver_sql(f"DROP TABLE {', '.join(replaced)}")
+        except Exception as e:
+            with self.engine.begin() as connection:
+                for staging in staged.values():
+                    connection.exec_driver_sql(f"DROP TABLE IF EXISTS `{staging}`")
+            raise Exception(f"Failed to load tables: {str(e)}")
+    
+    def apply_delta(self, table_name: str, df: pd.DataFrame, delta: TableDelta, key: str = None) -> str:
+        """Write an incremental load in one transaction and refresh only the caches it affects"""
+        storage = "MySQL" if self.engine else "SQLite"
+        changed = len(delta.inserts) + len(delta.delete_keys)
+        if changed:
+            if self.engine:
+                with self.engine.begin() as connection:
+                    for start in range(0, len(delta.delete_keys), 1000):
+                        chunk = delta.delete_keys[start:start + 1000]
+                        connection.exec_driver_sql(
+                            f"DELETE FROM `{table_name}` WHERE `{key}` IN ({', '.join(['%s'] * len(chunk))})", tuple(chunk))
+                    delta.inserts.to_sql(table_name, connection, if_exists='append', index=False)
+            else:
+                quoted = '"' + table_name.replace('"', '""') + '"'
+                with self.get_sqlite_db().writer() as connection:
+                    if delta.delete_keys:
+                        quoted_key = '"' + key.replace('"', '""') + '"'
+                        connection.executemany(f"DELETE FROM {quoted} WHERE {quoted_key} = ?",
+                                               [(value,) for value in delta.delete_keys])
+                    delta.inserts.to_sql(table_name, connection, if_exists='append', index=False)
+            
+            info = self.tables[table_name]
+            self.value_index.add_table(table_name, df)
+            # Cost estimates scale with row counts: a small delta leaves cached plans valid
+            if changed > self.plan_refresh_ratio * max(1, info['row_count']):
+                self.sql_guard.clear_plans()
+            info.update(sample_data=df.head(3).to_dict('records'), row_count=len(df))
+            TABLE_BYTES.set(int(df.memory_usage(deep=True).sum()), session=self.session_id, table=table_name)
+        self.tables[table_name]['fingerprint'] = fingerprint(df, key)
+        
+        return (f"Updated {storage} table '{table_name}': {delta.unchanged} rows unchanged, "
+                f"{len(delta.inserts)} written, {len(delta.delete_keys)} deleted or replaced")
+    
+    def get_sqlite_db(self) -> SQLiteConnectionManager:
+        """Database for file-only mode: one writer for loads, per-thread read connections"""
+        if self.sqlite_db is None:
+            self.sqlite_db = SQLiteConnectionManager()
+        return self.sqlite_db
+    
+    def attach_dataset(self, dataset, table_name: str) -> str:
+        """Use a dataset from the shared table store as ``table_name`` without copying it"""
+        return self.attach_datasets([(dataset, table_name)])[0]
+    
+    def attach_datasets(self, pairs: List[tuple]) -> List[str]:
+        """``attach_dataset`` for several (dataset, table name) pairs; queries see all of them or none"""
+        source_tables = self.table_store.attach_many(self.get_sqlite_db(), pairs)
+        
+        messages = []
+        for (dataset, table_name), source_table in zip(pairs, source_tables):
+            self.value_index.remove_table(table_name)
+            for col, values in dataset.values.items():
+                self.value_index.add_column(table_name, col, values)
+            self.tables[table_name] = dict(dataset.info, source_table=source_table)
+            TABLE_BYTES.set(dataset.info.get('memory_bytes', 0), session=self.session_id, table=table_name)
+            messages.append(f"Loaded {dataset.info['row_count']} rows into shared table '{table_name}'")
+        self.sql_guard.clear_plans()
+        return messages
+    
+    def close(self):
+        """Drop this session's table gauges and release its database connections"""
+        drop_table_gauges(self.session_id, self.tables)
+        if self.sqlite_db is not None:
+            self.sqlite_db.close()
+            self.sqlite_db = None
+        if self.engine is not None:
+            self.engine.dispose()
     
     def get_available_tables(self) -> list:
         return list(self.tables.keys())
@@ -114,104 +395,157 @@ class DataAnalystAssistant:
         
         return sql
     
-    def clean_sql(self, sql: str) -> str:
-        sql = re.sub(r'```sql\n?|```\n?|SQL:|Query:', '', sql, flags=re.IGNORECASE)
-        sql = sql.strip()
-        
-        sql_pattern = r'(SELECT.*?(?:;|$)|INSERT.*?(?:;|$)|UPDATE.*?(?:;|$)|DELETE.*?(?:;|$))'
-        match = re.search(sql_pattern, sql, re.IGNORECASE | re.DOTALL)
-        
-        if match:
-            cleaned = match.group(1).strip().rstrip(';')
-            return self.quote_column_names(cleaned)
-        
-        lines = []
-        for line in sql.split('\n'):
-            line = line.strip()
-            if line and not line.startswith('#') and not line.startswith('--'):
-                if any(word in line.lower() for word in ['to find', 'you would', "here's how", 'this query']):
-                    continue
-                if line.upper().startswith(('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'FROM', 'WHERE')):
-                    lines.append(line)
-        
-        cleaned = ' '.join(lines).strip()
-        return self.quote_column_names(cleaned)
+    def sql_from_json(self, result: Dict[str, Any]) -> str:
+        """The "sql" field of a structured response, quoted for MySQL; '' unless it is a SELECT/WITH"""
+        sql = str(result.get('sql') or '').strip().rstrip(';').strip()
+        if not re.match(r'^(SELECT|WITH)\b', sql, re.IGNORECASE):
+            return ''
+        return self.quote_column_names(sql)
+    
+    def identify_language(self, text: str) -> tuple:
+        """(language code, confidence) from the local n-gram model; 'en' unless it is confidently not English"""
+        code, confidence = language_id.detect(text)
+        if code != 'en':
+            # A Spanish/Portuguese split lowers ``confidence`` without making English any likelier
+            english = language_id.english_probability(text)
+            if english > 1 - self.language_confidence:
+                return 'en', english
+        return code, confidence
     
     def detect_language(self, text: str) -> str:
-        # Enhanced language detection
-        english_words = ['what', 'show', 'get', 'find', 'list', 'count', 'sum', 'average', 'top', 'highest', 'lowest', 'how', 'which', 'where', 'when', 'why', 'the', 'and', 'or', 'of', 'in', 'to', 'for']
-        english_count = sum(1 for word in english_words if word in text.lower())
-        
-        # If more than 2 English words found, consider it English
-        if english_count >= 2:
-            return 'english'
-        
-        # Check for non-Latin characters (indicates non-English)
-        has_non_latin = any(ord(char) > 127 for char in text)
-        if has_non_latin:
-            return 'other'
-        
-        # Default to English if uncertain
-        return 'english'
+        return 'english' if self.identify_language(text)[0] == 'en' else 'other'
     
     def translate_to_english(self, text: str) -> tuple:
+        """(English text, source language code); no LLM call when the text is already English"""
+        language = self.identify_language(text)[0]
         try:
-            if self.detect_language(text) == 'english':
-                return text, 'english'
+            if language == 'en':
+                return text, 'en'
+            
+            remembered = self.translation_memory.lookup(language, 'en', text)
+            if remembered:
+                return remembered, language
             
             # Enhanced translation to English with better context
-            translate_prompt = f"""Translate this text to clear, natural English. Preserve the original meaning and intent exactly.
+            translate_prompt = f"""Translate this {language_id.LANGUAGE_NAMES.get(language, '')} text to clear, natural English. Preserve the original meaning and intent exactly.
 
 Text: {text}
 
 Provide only the English translation:"""
             
-            response = requests.post(f"{self.ollama_url}/api/generate", json={
-                "model": "llama3",
-                "prompt": translate_prompt,
-                "stream": False,
-                "options": {"temperature": 0.1, "num_predict": 100}
-            })
-            
-            if response.status_code == 200:
-                result = response.json()
-                if result and "response" in result and result["response"]:
-                    translated = result["response"].strip()
-                    # Clean up common prefixes
-                    if translated.lower().startswith(('english translation:', 'translation:', 'english:')):
-                        translated = translated.split(':', 1)[1].strip()
-                    return translated, 'other'
+            result = self.router.generate('translation', translate_prompt, {"temperature": 0.1, "num_predict": 100})
+            if result:
+                self.record_llm(result, 'translation')
+                translated = result["response"].strip()
+                # Clean up common prefixes
+                if translated.lower().startswith(('english translation:', 'translation:', 'english:')):
+                    translated = translated.split(':', 1)[1].strip()
+                self.translation_memory.store(language, 'en', text, translated)
+                return translated, language
         except Exception:
             pass
         
-        return text, 'english'
+        return text, 'en'
     
-    def translate_from_english(self, english_text: str, original_text: str) -> str:
+    def translate_from_english(self, english_text: str, original_text: str, language: str = None) -> str:
         try:
-            # Much simpler and direct prompt
-            translate_prompt = f"Translate '{english_text}' to the same language as '{original_text}'"
+            language = language or self.identify_language(original_text)[0]
+            remembered = self.translation_memory.lookup('en', language, english_text)
+            if remembered:
+                return remembered
             
-            response = requests.post(f"{self.ollama_url}/api/generate", json={
-                "model": "llama3",
-                "prompt": translate_prompt,
-                "stream": False,
-                "options": {"temperature": 0.2, "num_predict": 100}
-            })
+            language_name = language_id.LANGUAGE_NAMES.get(language)
+            if language_name:
+                translate_prompt = f"Translate this text to {language_name}. Provide only the translation.\n\n{english_text}"
+            else:
+                translate_prompt = f"Translate '{english_text}' to the same language as '{original_text}'"
             
-            if response.status_code == 200:
-                result = response.json()
-                if result and "response" in result and result["response"]:
-                    translated = result["response"].strip()
-                    # Don't return if it's the same as original question
-                    if translated != original_text and len(translated) > 10:
-                        return translated
+            result = self.router.generate('translation', translate_prompt, {"temperature": 0.2, "num_predict": 100})
+            if result:
+                self.record_llm(result, 'back_translation')
+                translated = result["response"].strip()
+                # Don't return if it's the same as original question
+                if translated != original_text and len(translated) > 10:
+                    self.translation_memory.store('en', language, english_text, translated)
+                    return translated
                     
         except Exception as e:
             pass
         return english_text
     
-    def nl_to_sql(self, question: str) -> str:
-        english_question, _ = self.translate_to_english(question)
+    def sql_token_budget(self, extra: int = 0) -> int:
+        """num_predict for SQL generation, growing with the schema the query may have to touch"""
+        columns = sum(len(info['columns']) for info in self.tables.values())
+        return min(1024, 160 + 4 * columns + 48 * len(self.tables) + extra)
+    
+    def nl_to_sql(self, question: str, english_question: str = None) -> str:
+        return self.nl_to_sql_structured(question, english_question)['sql']
+    
+    def follow_up_context(self, question: str, previous: Dict[str, Any] = None, cue_words: bool = True) -> str:
+        """Prompt section with the previous question and SQL when ``question`` reads like a follow-up.
+        
+        ``cue_words=False`` skips the English "now only..." check for questions in other languages.
+        """
+        if not previous or not previous.get('success') or (cue_words and not is_follow_up(question)):
+            return ""
+        return f"""PREVIOUS QUESTION: {previous['question']}
+PREVIOUS SQL: {previous['sql_query']}
+If the question below follows up on it, modify the previous SQL rather than starting over.
+"""
+    
+    def table_signatures(self, table_names) -> List[str]:
+        return [table_signature(name, self.tables[name]['columns']) for name in table_names]
+    
+    def examples_for(self, question: str) -> str:
+        """Prompt section with the most similar accepted examples for the loaded tables, if any"""
+        similar = self.examples.similar(question, self.table_signatures(self.tables), self.example_count)
+        if not similar:
+            return ""
+        lines = '\n'.join(f'- "{q}" → {sql}' for q, sql, _ in similar)
+        return f"""EXAMPLES of accepted answers to similar questions:
+{lines}
+"""
+    
+    def accept_result(self, result: Dict[str, Any]) -> bool:
+        """Record an answer the user accepted as a few-shot example; False when it can't be one"""
+        if not result.get('success') or result.get('sql_confidence') == 0.0:
+            return False    # keyword fallback: a guess, not an answer
+        question = result.get('english_question') or result['question']
+        if result.get('follow_up') or is_follow_up(question):
+            return False    # "now only for Asia" means nothing without the previous question
+        used = tables_in_sql(result['sql_query'], self.tables)
+        if not used:
+            return False
+        self.examples.add(question, result['sql_query'], self.table_signatures(used))
+        return True
+    
+    def refine_previous(self, question: str, previous: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
+        """Rewrite the previous SQL for a follow-up that only filters, sorts or limits it.
+        
+        Returns {sql, tables_used, frame}, where frame is the previous result
+        refined in pandas when that gives the same answer as running the SQL,
+        or None when the question needs the LLM.
+        """
+        if not previous or not previous.get('success'):
+            return None
+        tables = tables_in_sql(previous['sql_query'], self.tables)
+        results = pd.DataFrame(previous.get('results') or [])
+        refinement = parse_refinement(question, self.value_index,
+                                      {table: self.tables[table]['columns'] for table in tables},
+                                      list(results.columns), previous['sql_query'])
+        if refinement is None:
+            return None
+        sql = refine_sql(previous['sql_query'], refinement)
+        if sql is None:
+            return None
+        frame = None if previous.get('truncated') else refine_frame(results, refinement, previous['sql_query'])
+        return {'sql': sql, 'tables_used': tables, 'frame': frame}
+    
+    def nl_to_sql_structured(self, question: str, english_question: str = None,
+                             previous: Dict[str, Any] = None) -> Dict[str, Any]:
+        """{sql, tables_used, confidence} from a JSON-schema constrained LLM call"""
+        if english_question is None:
+            english_question, _ = self.translate_to_english(question)
         
         schema = self.get_schema_context()
         table_names = list(self.tables.keys())
@@ -220,115 +554,290 @@ Provide only the English translation:"""
             raise Exception("No tables loaded. Please upload a file first.")
         
         prompt = f"""{schema}
+{self.value_index.prompt_hints(english_question, question)}{self.follow_up_context(english_question, previous)}{self.examples_for(english_question)}
+Write a SQL query for this question: {english_question}
 
-Generate ONLY a SQL query for this question: {english_question}
-
-IMPORTANT:
-- Return ONLY the SQL query
-- No explanations or text
-- Start with SELECT
-- Use exact table/column names from schema
-- Put column names with spaces in backticks like `Invoice Number`
-
-SQL:"""
+Respond with a JSON object:
+- "sql": one SELECT query; exact table/column names from the schema; column names with spaces in backticks like `Invoice Number`
+- "tables_used": the tables the query reads
+- "confidence": 0 to 1, how sure you are the query answers the question"""
         
-        try:
-            response = requests.post(f"{self.ollama_url}/api/generate", json={
-                "model": "llama3",
-                "prompt": prompt,
-                "stream": False,
-                "options": {"temperature": 0, "num_predict": 50}
-            })
-            
-            if response.status_code == 200:
-                result = response.json()
-                if result and "response" in result and result["response"]:
-                    return self.clean_sql(result["response"])
-        except Exception:
-            pass
+        result = self.generate_json(prompt, 'sql_generation', self.sql_token_budget(), self.SQL_RESPONSE_SCHEMA)
+        sql = self.sql_from_json(result)
+        if sql:
+            try:
+                confidence = min(1.0, max(0.0, float(result.get('confidence', 0.5))))
+            except (TypeError, ValueError):
+                confidence = 0.5
+            tables_used = [t for t in result.get('tables_used') or [] if t in self.tables]
+            return {'sql': sql, 'tables_used': tables_used, 'confidence': confidence}
         
         if 'count' in question.lower():
-            return f"SELECT COUNT(*) FROM `{table_names[0]}`"
+            SQL_FALLBACKS.inc(kind='count')
+            sql = f"SELECT COUNT(*) FROM `{table_names[0]}`"
         elif any(word in question.lower() for word in ['top', 'highest', 'max']):
-            return f"SELECT * FROM `{table_names[0]}` LIMIT 10"
+            SQL_FALLBACKS.inc(kind='top')
+            sql = f"SELECT * FROM `{table_names[0]}` LIMIT 10"
         else:
-            return f"SELECT * FROM `{table_names[0]}` LIMIT 5"
+            SQL_FALLBACKS.inc(kind='list')
+            sql = f"SELECT * FROM `{table_names[0]}` LIMIT 5"
+        return {'sql': sql, 'tables_used': [table_names[0]], 'confidence': 0.0}
+    
+    def generate_json(self, prompt: str, purpose: str, num_predict: int = 200, schema: Dict = None) -> Dict[str, Any]:
+        """Ollama call constrained to JSON (or a JSON schema); the parsed object, or {} on any failure"""
+        try:
+            result = self.router.generate('sql', prompt, {"temperature": 0, "num_predict": num_predict},
+                                          format=schema or "json")
+            if result:
+                self.record_llm(result, purpose)
+                parsed = json.loads(result.get("response") or "{}")
+                return parsed if isinstance(parsed, dict) else {}
+        except Exception:
+            pass
+        return {}
+    
+    def nl_to_sql_multilingual(self, question: str, previous: Dict[str, Any] = None) -> tuple:
+        """(sql, english question, language code) from a single LLM call on the original question"""
+        table_names = list(self.tables.keys())
+        if not table_names:
+            raise Exception("No tables loaded. Please upload a file first.")
+        
+        prompt = f"""{self.get_schema_context()}
+{self.value_index.prompt_hints(question)}{self.follow_up_context(question, previous, cue_words=False)}
+QUESTION (may be in any language): {question}
+
+Respond with a JSON object with these keys:
+- "language": ISO 639-1 code of the question's language
+- "english_question": the question translated to English
+- "sql": one SELECT query answering it, using exact table/column names from the schema, column names with spaces in backticks like `Invoice Number`"""
+        
+        result = self.generate_json(prompt, 'sql_generation', self.sql_token_budget(extra=96), self.MULTILINGUAL_SQL_SCHEMA)
+        sql = self.sql_from_json(result)
+        if not sql:
+            # Fall back to the separate translate -> SQL path
+            english_question, language = self.translate_to_english(question)
+            return self.nl_to_sql_structured(question, english_question, previous)['sql'], english_question, language
+        
+        language = str(result.get('language') or '').lower()[:2]
+        if language not in language_id.LANGUAGE_NAMES:
+            language = self.identify_language(question)[0]
+        english_question = str(result.get('english_question') or question)
+        if language != 'en' and english_question != question:
+            self.translation_memory.store(language, 'en', question, english_question)
+        return sql, english_question, language
+    
+    def govern_query(self, sql_query: str) -> str:
+        """Estimate cost from the query plan; rewrite or refuse over-budget queries"""
+        canonical = self.sql_guard.parse(sql_query).canonical
+        cost = self.sql_guard.cached_plan(canonical)
+        CACHE_REQUESTS.inc(cache='plan', result='miss' if cost is None else 'hit')
+        if cost is None:
+            try:
+                if self.engine:
+                    with self.engine.connect() as connection:
+                        cost = self.governor.estimate_mysql_cost(connection, sql_query)
+                elif self.sqlite_db:
+                    row_counts = {name: info.get('row_count', 1) for name, info in self.tables.items()}
+                    row_counts.update({info['source_table']: info.get('row_count', 1)
+                                       for info in self.tables.values() if 'source_table' in info})
+                    cost = self.governor.estimate_sqlite_cost(self.sqlite_db.reader(), sql_query, row_counts)
+                else:
+                    raise Exception("No database connection available")
+            except Exception as e:
+                raise Exception(f"Query failed: {str(e)}")
+            self.sql_guard.store_plan(canonical, cost)
+        return self.governor.govern(sql_query, cost)
     
     def execute_query(self, sql_query: str) -> pd.DataFrame:
+        parsed = self.sql_guard.parse(sql_query)
         try:
             if self.engine:
-                return pd.read_sql_query(sql_query, self.engine)
-            elif hasattr(self, 'sqlite_conn'):
-                return pd.read_sql_query(sql_query, self.sqlite_conn)
+                return self.governor.run_mysql(self.engine, parsed.text)
+            elif self.sqlite_db:
+                # Canonical text + params hits sqlite3's prepared statement cache
+                return self.governor.run_sqlite(self.sqlite_db.reader(), parsed.canonical, parsed.params)
             else:
                 raise Exception("No database connection available")
+        except QueryCancelled:
+            raise
+        except Exception as e:
+            raise Exception(f"Query failed: {str(e)}")
+    
+    def record_llm(self, result: Dict[str, Any], purpose: str):
+        """Count an Ollama response in the current trace and the service metrics"""
+        if not isinstance(result, dict):
+            return
+        record_llm(result)
+        model = result.get('model') or 'llama3'
+        LLM_CALLS.inc(model=model, purpose=purpose)
+        LLM_TOKENS.inc(result.get('prompt_eval_count') or 0, model=model, kind='prompt')
+        LLM_TOKENS.inc(result.get('eval_count') or 0, model=model, kind='completion')
+    
+    def stream_query(self, sql_query: str) -> Iterator[pd.DataFrame]:
+        """Yield the result in DataFrame chunks; MySQL rows stay on the server until read"""
+        parsed = self.sql_guard.parse(sql_query)
+        try:
+            if self.engine:
+                yield from self.governor.stream_mysql(self.engine, parsed.text, self.stream_chunksize)
+            else:
+                yield self.execute_query(sql_query)
+        except QueryCancelled:
+            raise
         except Exception as e:
+            if str(e).startswith("Query failed:"):
+                raise
             raise Exception(f"Query failed: {str(e)}")
     
-    def generate_insights(self, question: str, query: str, results: pd.DataFrame) -> str:
-        if len(results) == 0:
+    def execute_streamed(self, sql_query: str) -> StreamedResult:
+        """Consume ``stream_query`` into a bounded head, a chart sample and a row count"""
+        streamed = StreamedResult(self.max_result_rows, self.chart_sample_rows)
+        start = time.perf_counter()
+        streamed.consume(self.stream_query(sql_query))
+        QUERY_SECONDS.observe(time.perf_counter() - start, backend='mysql' if self.engine else 'sqlite')
+        return streamed
+    
+    def cancel_query(self):
+        """Cancel the query currently running for this assistant (callable from any thread)"""
+        self.governor.cancel()
+    
+    def pool_status(self) -> Dict[str, Any]:
+        """Connection pool gauges plus connect/checkout/invalidation counters"""
+        if self.engine is None:
+            return {}
+        pool = self.engine.pool
+        return {
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+            **self.pool_events
+        }
+    
+    def generate_insights(self, question: str, query: str, results: pd.DataFrame, row_count: int = None,
+                          language: str = None) -> str:
+        if row_count is None:
+            row_count = len(results)
+        if row_count == 0:
             return "No results found for your query."
         
-        summary = f"Query returned {len(results)} rows."
+        summary = f"Query returned {row_count} rows."
         if len(results) > 0:
             summary += f" Sample: {results.head(2).to_dict('records')}"
         
         prompt = f"Question: {question}\nResults: {summary}\n\nAnswer the question naturally based on the results. Be conversational and helpful."
+        if language and language != 'en':
+            prompt += f" Answer in {language_id.LANGUAGE_NAMES.get(language, 'the language of the question')}."
         
         try:
-            response = requests.post(f"{self.ollama_url}/api/generate", json={
-                "model": "llama3",
-                "prompt": prompt,
-                "stream": False,
-                "options": {"temperature": 0.2, "num_predict": 80}
-            })
-            
-            if response.status_code == 200:
-                result = response.json()
-                if result and "response" in result and result["response"]:
-                    return result["response"].strip()
+            result = self.router.generate('insights', prompt, {
+                "temperature": 0.2, "num_predict": 80 if not language or language == 'en' else 160})
+            if result:
+                self.record_llm(result, 'insights')
+                return result["response"].strip()
         except Exception:
             pass
         
-        return f"Found {len(results)} results for your query."
+        return f"Found {row_count} results for your query."
     
-    def analyze(self, question: str) -> Dict[str, Any]:
+    def analyze(self, question: str, previous: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Answer ``question``; ``previous`` is the last answer in the conversation, for follow-ups"""
+        trace = Trace()
+        with trace.activate():
+            result = self._analyze(question, trace, previous)
+        result['timings'] = trace.timings()
+        QUESTIONS.inc(status='success' if result['success'] else 'error')
+        for span in trace.spans:
+            STAGE_SECONDS.observe(span.seconds, stage=span.name)
+        if self.trace_exporter:
+            self.trace_exporter.export(trace)
+        return result
+    
+    def _analyze(self, question: str, trace: Trace, previous: Dict[str, Any] = None) -> Dict[str, Any]:
         try:
-            english_question, original_language = self.translate_to_english(question)
+            refined = None
+            if previous:
+                # Refinements parse only when every word is understood, so a match is English
+                with trace.stage('follow_up'):
+                    refined = self.refine_previous(question, previous)
+            # Combined mode: one call for language + SQL, one for insights already in that language
+            combined = not refined and self.combined_multilingual and self.identify_language(question)[0] != 'en'
+            if refined:
+                english_question, original_language = question, 'en'
+            elif combined:
+                with trace.stage('sql_generation'):
+                    sql_query, english_question, original_language = self.nl_to_sql_multilingual(question, previous)
+                    generated = {'tables_used': [], 'confidence': None}
+            else:
+                with trace.stage('translation'):
+                    english_question, original_language = self.translate_to_english(question)
+                if previous and original_language != 'en':
+                    with trace.stage('follow_up'):
+                        refined = self.refine_previous(english_question, previous)
             
-            sql_query = self.nl_to_sql(question)
-            results = self.execute_query(sql_query)
-            english_insights = self.generate_insights(english_question, sql_query, results)
+            if refined:
+                sql_query = refined['sql']
+                generated = {'tables_used': refined['tables_used'], 'confidence': 1.0}
+            elif not combined:
+                with trace.stage('sql_generation'):
+                    generated = self.nl_to_sql_structured(question, english_question, previous)
+                    sql_query = generated['sql']
+            if refined and refined['frame'] is not None:
+                # Filter/sort/limit of a complete previous result: no database round trip
+                with trace.stage('execution'):
+                    streamed = StreamedResult(self.max_result_rows, self.chart_sample_rows).consume([refined['frame']])
+                    results = streamed.frame()
+                    record('rows', streamed.row_count)
+            else:
+                with trace.stage('governance'):
+                    sql_query = self.govern_query(sql_query)
+                with trace.stage('execution'):
+                    streamed = self.execute_streamed(sql_query)
+                    results = streamed.frame()
+                    record('rows', streamed.row_count)
+            with trace.stage('insights'):
+                if combined:
+                    english_insights = self.generate_insights(question, sql_query, results, streamed.row_count, original_language)
+                else:
+                    english_insights = self.generate_insights(english_question, sql_query, results, streamed.row_count)
             
             # Always translate insights back if it was a non-English question
-            if original_language == 'other':
-                insights = self.translate_from_english(english_insights, question)
-                
-                # If translation failed, try simpler approach
-                if insights == english_insights or self.detect_language(insights) == 'english':
-                    simple_prompt = f"Convert this English text to the same language as '{question}': {english_insights}"
-                    try:
-                        response = requests.post(f"{self.ollama_url}/api/generate", json={
-                            "model": "llama3",
-                            "prompt": simple_prompt,
-                            "stream": False,
-                            "options": {"temperature": 0.2, "num_predict": 200}
-                        })
-                        if response.status_code == 200:
-                            result = response.json()
-                            if result and "response" in result:
+            if original_language != 'en' and not combined:
+                with trace.stage('back_translation'):
+                    insights = self.translate_from_english(english_insights, question, original_language)
+                    
+                    # If translation failed, try simpler approach
+                    if insights == english_insights or self.detect_language(insights) == 'english':
+                        language_name = language_id.LANGUAGE_NAMES.get(original_language, f"the same language as '{question}'")
+                        simple_prompt = f"Convert this English text to {language_name}: {english_insights}"
+                        try:
+                            result = self.router.generate('translation', simple_prompt, {"temperature": 0.2, "num_predict": 200})
+                            if result:
+                                self.record_llm(result, 'back_translation')
                                 insights = result["response"].strip()
-                    except Exception:
-                        pass
+                                self.translation_memory.store('en', original_language, english_insights, insights)
+                        except Exception:
+                            pass
             else:
                 insights = english_insights
             
+            with trace.stage('serialization'):
+                records = results.to_dict('records')
+                chart_data = streamed.sample().to_dict('records') if streamed.truncated else None
+                record('bytes', len(json.dumps([records, chart_data], default=str).encode()))
+            
             return {
                 'question': question,
-                'english_question': english_question if original_language == 'other' else None,
-                'was_translated': original_language == 'other',
+                'english_question': english_question if original_language != 'en' else None,
+                'was_translated': original_language != 'en',
+                'language': original_language,
                 'sql_query': sql_query,
-                'results': results.to_dict('records'),
+                'tables_used': generated['tables_used'],
+                'sql_confidence': generated['confidence'],
+                'follow_up': None if refined is None else 'sql' if refined['frame'] is None else 'previous_result',
+                'results': records,
+                'row_count': streamed.row_count,
+                'truncated': streamed.truncated,
+                'chart_data': chart_data,
                 'insights': insights,
                 'success': True
             }
@@ -341,4 +850,41 @@ SQL:"""
             }
     
     def load_excel(self, file_path: str, table_name: str = None) -> str:
-        return self.load_file(file_path, table_name)
\ No newline at end of file
+        return self.load_file(file_path, table_name)
+    
+    def load_workbook(self, source, sheets: List = None, columns: List[str] = None, table_name: str = None,
+                      file_name: str = None) -> List[str]:
+        """Load sheets of an Excel workbook (all by default) as tables, parsed in parallel.
+        
+        One sheet becomes ``table_name``; several become ``<table_name>_<sheet>``.
+        """
+        file_name = file_name or source_name(source)
+        base = table_name or os.path.splitext(file_name)[0].lower()
+        data = source_buffer(source)
+        frames = read_workbook(data, sheets, columns)
+        if not frames:
+            raise Exception("No sheets selected")
+        names = {}
+        for sheet in frames:
+            suffix = re.sub(r'\W+', '_', sheet).strip('_').lower()
+            names[sheet] = base if len(frames) == 1 else f"{base}_{suffix}"
+        
+        if self.engine:
+            self.replace_mysql_tables({names[sheet]: df for sheet, df in frames.items()})
+            for sheet, df in frames.items():
+                self.register_table(names[sheet], df)
+            return [f"Loaded {len(df)} rows from sheet '{sheet}' into MySQL table '{names[sheet]}'"
+                    for sheet, df in frames.items()]
+        
+        digest = content_digest(data)
+        pairs = [(self.table_store.get_or_load(data, file_name, df, self.dataset_variant(sheet, columns), digest),
+                  names[sheet]) for sheet, df in frames.items()]
+        return self.attach_datasets(pairs)
+    
+    @staticmethod
+    def dataset_variant(sheet=None, columns: List[str] = None) -> Optional[str]:
+        """Table store variant for a sheet/column selection; None for a whole file read with defaults"""
+        if sheet is None and not columns:
+            return None
+        variant = f"columns={sorted(columns)}" if columns else ""
+        return f"sheet={sheet};{variant}"
\ No newline at end of file
@@ -1,16 +1,23 @@
 import pandas as pd
-import sqlite3
-import requests
 from typing import Dict, Any
 import os
 import json
 import re
+from value_index import ValueIndex
+from sql_guard import SQLGuard, UnsafeQuery
+from sql_validator import SQLValidator
+from sqlite_pool import SQLiteConnectionManager
+from model_router import ModelRouter
 
 class DataAnalystAssistant:
-    def __init__(self, ollama_url: str = "http://localhost:11434"):
+    def __init__(self, ollama_url: str = "http://localhost:11434", router: ModelRouter = None):
         self.ollama_url = ollama_url
-        self.db_connection = sqlite3.connect(':memory:', check_same_thread=False)
+        self.router = router or ModelRouter(ollama_url)
+        self.db = SQLiteConnectionManager()
         self.tables = {}
+        self.value_index = ValueIndex()
+        self.sql_guard = SQLGuard()
+        self.validator = SQLValidator(self.tables, self.explain_query)
         
     def load_file(self, file_path: str, table_name: str = None) -> str:
         if not table_name:
@@ -21,8 +28,11 @@ class DataAnalystAssistant:
         else:
             df = pd.read_excel(file_path)
             
-        df.to_sql(table_name, self.db_connection, if_exists='replace', index=False)
+        with self.db.writer() as connection:
+            df.to_sql(table_name, connection, if_exists='replace', index=False)
         
+        self.value_index.add_table(table_name, df)
+        self.sql_guard.clear_plans()
         self.tables[table_name] = {
             'columns': list(df.columns),
             'sample_data': df.head(3).to_dict('records')
@@ -68,8 +78,8 @@ class DataAnalystAssistant:
         sql = re.sub(r'```sql\n?|```\n?|SQL:|Query:', '', sql, flags=re.IGNORECASE)
         sql = sql.strip()
         
-        # Find actual SQL query - look for SELECT, INSERT, UPDATE, DELETE
-        sql_pattern = r'(SELECT.*?(?:;|$)|INSERT.*?(?:;|$)|UPDATE.*?(?:;|$)|DELETE.*?(?:;|$))'
+        # Find actual SQL query - only read-only SELECT / WITH ... SELECT
+        sql_pattern = r'(WITH\s+\w+\s+AS\s*\(.*?(?:;|$)|SELECT.*?(?:;|$))'
         match = re.search(sql_pattern, sql, re.IGNORECASE | re.DOTALL)
         
         if match:
@@ -84,10 +94,11 @@ class DataAnalystAssistant:
                 # Skip explanatory text
                 if any(word in line.lower() for word in ['to find', 'you would', 'here\'s how', 'this query']):
                     continue
-                if line.upper().startswith(('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'FROM', 'WHERE')):
+                if line.upper().startswith(('SELECT', 'WITH', 'FROM', 'WHERE')):
                     lines.append(line)
         
-        cleaned = ' '.join(lines).strip()
+        # Nothing SQL-shaped ("SELEC ..."): keep the text so validation can send it to repair
+        cleaned = ' '.join(lines).strip() or sql
         return self.quote_column_names(cleaned)
     
     def nl_to_sql(self, question: str) -> str:
@@ -99,7 +110,7 @@ class DataAnalystAssistant:
         
         # Better prompt for accurate SQL with column quoting
         prompt = f"""{schema}
-
+{self.value_index.prompt_hints(question)}
 Generate ONLY a SQL query for this question: {question}
 
 IMPORTANT:
@@ -112,27 +123,13 @@ IMPORTANT:
 SQL:"""
         
         try:
-            response = requests.post(f"{self.ollama_url}/api/generate", json={
-                "model": "llama3",
-                "prompt": prompt,
-                "stream": False,
-                "options": {"temperature": 0, "num_predict": 50}
-            })
-            
-            if response.status_code == 200:
-                result = response.json()
-                if result and "response" in result and result["response"]:
-                    return self.clean_sql(result["response"])
+            result = self.router.generate('sql', prompt, {"temperature": 0, "num_predict": 50})
+            if result:
+                return self.clean_sql(result["response"])
         except Exception:
             pass
         
-        # Smart fallback
-        if 'count' in question.lower():
-            return f"SELECT COUNT(*) FROM {table_names[0]}"
-        elif any(word in question.lower() for word in ['top', 'highest', 'max']):
-            return f"SELECT * FROM {table_names[0]} LIMIT 10"
-        else:
-            return f"SELECT * FROM {table_names[0]} LIMIT 5"
+        raise Exception("Could not generate SQL for this question. Please rephrase it or try again.")
     
     def validate_and_fix_query(self, sql_query: str) -> str:
         """Validate and attempt to fix common SQL issues"""
@@ -148,39 +145,59 @@ SQL:"""
         
         return sql_query
     
+    def explain_query(self, sql_query: str):
+        """Compile the query with EXPLAIN; raises on errors without reading table data"""
+        self.db.reader().execute(f"EXPLAIN {sql_query}")
+    
+    def repair_sql(self, sql_query: str, error: str) -> str:
+        """Single targeted LLM repair using the exact database error"""
+        prompt = f"""{self.get_schema_context()}
+This SQL query fails: {sql_query}
+Error: {error}
+
+Return ONLY the corrected SQL query using exact table/column names from the schema.
+
+SQL:"""
+        
+        try:
+            result = self.router.generate('sql', prompt, {"temperature": 0, "num_predict": 150})
+            if result:
+                return self.clean_sql(result["response"])
+        except Exception:
+            pass
+        return None
+    
+    def check_query(self, sql_query: str) -> tuple:
+        """(sql, error) from the read-only guard, then the schema validator; error is None when it may run"""
+        sql_query = self.validate_and_fix_query(sql_query)
+        try:
+            canonical = self.sql_guard.parse(sql_query).canonical
+        except UnsafeQuery as e:
+            return sql_query, str(e)    # often just a typo ("SELEC"), which repair can fix
+        if self.sql_guard.cached_plan(canonical):
+            return sql_query, None  # same query shape already compiled fine
+        return self.validator.validate(sql_query)
+    
+    def validate_query(self, sql_query: str) -> str:
+        """Validate against the schema before execution, repairing when possible"""
+        sql_query, error = self.check_query(sql_query)
+        if error:
+            repaired = self.repair_sql(sql_query, error)
+            if repaired:
+                sql_query, error = self.check_query(repaired)
+        if error:
+            if "no such table" in error.lower():
+                raise Exception(f"Table not found. Available: {list(self.tables.keys())}")
+            raise Exception(f"Invalid SQL: {error}")
+        self.sql_guard.store_plan(self.sql_guard.parse(sql_query).canonical, True)
+        return sql_query
+    
     def execute_query(self, sql_query: str) -> pd.DataFrame:
+        parsed = self.sql_guard.parse(sql_query)
         try:
-            # First attempt with validation
-            validated_query = self.validate_and_fix_query(sql_query)
-            return pd.read_sql_query(validated_query, self.db_connection)
+            # Canonical text + params hits sqlite3's prepared statement cache
+            return pd.read_sql_query(parsed.canonical, self.db.reader(), params=parsed.params)
         except Exception as e:
-            error_msg = str(e).lower()
-            
-            if "no such table" in error_msg:
-                available = list(self.tables.keys())
-                raise Exception(f"Table not found. Available: {available}")
-            elif "syntax error" in error_msg and "near" in error_msg:
-                # Try to fix syntax errors by adding quotes around problematic identifiers
-                try:
-                    # More aggressive column name quoting
-                    fixed_query = sql_query
-                    for table_name, info in self.tables.items():
-                        for col in info['columns']:
-                            # Quote any column that might cause issues
-                            patterns = [
-                                rf'\b{re.escape(col)}\b(?![`\w])',  # Not already quoted
-                                rf'= {re.escape(col)}\b',
-                                rf'SELECT {re.escape(col)}\b',
-                                rf', {re.escape(col)}\b',
-                                rf'WHERE {re.escape(col)}\b'
-                            ]
-                            for pattern in patterns:
-                                fixed_query = re.sub(pattern, f'`{col}`', fixed_query, flags=re.IGNORECASE)
-                    
-                    return pd.read_sql_query(fixed_query, self.db_connection)
-                except Exception:
-                    pass
-            
             raise Exception(f"Query failed: {str(e)}")
     
     def generate_insights(self, question: str, query: str, results: pd.DataFrame) -> str:
@@ -196,17 +213,9 @@ SQL:"""
         prompt = f"Question: {question}\nResults: {summary}\n\nAnswer the question naturally based on the results. Be conversational and helpful."
         
         try:
-            response = requests.post(f"{self.ollama_url}/api/generate", json={
-                "model": "llama3",
-                "prompt": prompt,
-                "stream": False,
-                "options": {"temperature": 0.2, "num_predict": 80}
-            })
-            
-            if response.status_code == 200:
-                result = response.json()
-                if result and "response" in result and result["response"]:
-                    return result["response"].strip()
+            result = self.router.generate('insights', prompt, {"temperature": 0.2, "num_predict": 80})
+            if result:
+                return result["response"].strip()
         except Exception:
             pass
         
@@ -217,7 +226,7 @@ SQL:"""
     
     def analyze(self, question: str) -> Dict[str, Any]:
         try:
-            sql_query = self.nl_to_sql(question)
+            sql_query = self.validate_query(self.nl_to_sql(question))
             results = self.execute_query(sql_query)
             insights = self.generate_insights(question, sql_query, results)
             
@@ -230,27 +239,8 @@ SQL:"""
             }
             
         except Exception as e:
-            # Try fallback queries for common issues
-            if "syntax error" in str(e).lower():
-                try:
-                    # Simple fallback - just show table contents
-                    table_name = list(self.tables.keys())[0] if self.tables else None
-                    if table_name:
-                        fallback_query = f"SELECT * FROM `{table_name}` LIMIT 5"
-                        results = pd.read_sql_query(fallback_query, self.db_connection)
-                        return {
-                            'question': question,
-                            'sql_query': fallback_query,
-                            'results': results.to_dict('records'),
-                            'insights': f"Had trouble with your query, showing sample data from {table_name} instead.",
-                            'success': True,
-                            'warning': f"Original error: {str(e)}"
-                        }
-                except Exception:
-                    pass
-            
             return {
                 'question': question,
                 'error': str(e),
                 'success': False
-            }
\ No newline at end of file
+            }
@@ -0,0 +1,117 @@
+import os
+import re
+import math
+import json
+import sqlite3
+import hashlib
+import threading
+from collections import Counter, defaultdict
+from typing import Iterable, List, Tuple
+
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'llm-data-analyst', 'example_store.db')
+
+STOPWORDS = {
+    'a', 'an', 'the', 'of', 'in', 'on', 'for', 'to', 'and', 'or', 'by', 'with', 'me', 'show', 'what',
+    'which', 'is', 'are', 'was', 'were', 'give', 'list', 'all', 'please', 'each', 'per', 'from',
+}
+
+
+def question_terms(question: str) -> Counter:
+    """Unigrams and adjacent-word bigrams of the question, stopwords removed"""
+    words = [w for w in re.findall(r'[a-z0-9]+', question.lower()) if w not in STOPWORDS]
+    terms = Counter(words)
+    terms.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return terms
+
+
+def table_signature(table_name: str, columns: Iterable[str]) -> str:
+    """Name plus a hash of the column list: examples only apply while the table looks the same"""
+    digest = hashlib.sha1('\x1f'.join(map(str, columns)).encode()).hexdigest()[:12]
+    return f"{table_name}:{digest}"
+
+
+class ExampleStore:
+    """Accepted (question, SQL) pairs retrieved by TF-IDF cosine similarity.
+
+    Each example remembers the signatures of the tables its SQL reads, and
+    is only offered while all of them are loaded with the same columns.
+    Lookups go through an inverted index, so only examples sharing a term
+    with the question are scored. Examples live in SQLite at ``path``; pass
+    a file such as ``DEFAULT_PATH`` to keep them across restarts.
+    """
+
+    def __init__(self, path: str = ':memory:', max_examples: int = 2000):
+        self.max_examples = max_examples
+        self._examples = {}                 # id -> (question, sql, frozenset of table signatures, terms)
+        self._postings = defaultdict(set)   # term -> example ids
+        self._lock = threading.Lock()
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""CREATE TABLE IF NOT EXISTS examples (
+            id INTEGER PRIMARY KEY, question TEXT, sql TEXT, tables TEXT, UNIQUE (question, sql))""")
+        for row_id, question, sql, tables in self._db.execute("SELECT id, question, sql, tables FROM examples ORDER BY id"):
+            self._index(row_id, question, sql, frozenset(json.loads(tables)))
+
+    def _index(self, row_id: int, question: str, sql: str, tables: frozenset):
+        terms = question_terms(question)
+        self._examples[row_id] = (question, sql, tables, terms)
+        for term in terms:
+            self._postings[term].add(row_id)
+
+    def _unindex(self, row_id: int):
+        _, _, _, terms = self._examples.pop(row_id)
+        for term in terms:
+            self._postings[term].discard(row_id)
+            if not self._postings[term]:
+                del self._postings[term]
+
+    def add(self, question: str, sql: str, table_signatures: Iterable[str]):
+        tables = frozenset(table_signatures)
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO examples (question, sql, tables) VALUES (?, ?, ?)",
+                (question, sql, json.dumps(sorted(tables))))
+            if cursor.rowcount:
+                self._index(cursor.lastrowid, question, sql, tables)
+            while len(self._examples) > self.max_examples:
+                oldest = min(self._examples)
+                self._unindex(oldest)
+                self._db.execute("DELETE FROM examples WHERE id = ?", (oldest,))
+            self._db.commit()
+
+    def similar(self, question: str, table_signatures: Iterable[str], k: int = 3,
+                min_score: float = 0.1) -> List[Tuple[str, str, float]]:
+        """Up to ``k`` (question, sql, score) examples most similar to ``question``"""
+        available = set(table_signatures)
+        terms = question_terms(question)
+        with self._lock:
+            total = len(self._examples)
+            if not total or not terms:
+                return []
+            idf = {term: math.log((1 + total) / (1 + len(self._postings.get(term, ())))) + 1 for term in terms}
+            query = {term: count * idf[term] for term, count in terms.items()}
+            query_norm = math.sqrt(sum(w * w for w in query.values()))
+
+            candidates = set()
+            for term in terms:
+                candidates |= self._postings.get(term, set())
+            scored = []
+            for row_id in candidates:
+                example_question, sql, tables, example_terms = self._examples[row_id]
+                if not tables <= available:
+                    continue
+                weights = {t: c * (math.log((1 + total) / (1 + len(self._postings[t]))) + 1)
+                           for t, c in example_terms.items()}
+                norm = math.sqrt(sum(w * w for w in weights.values()))
+                dot = sum(query[t] * weights[t] for t in query if t in weights)
+                score = dot / (query_norm * norm) if norm else 0.0
+                if score >= min_score:
+                    scored.append((score, row_id, example_question, sql))
+        scored.sort(key=lambda item: (-item[0], -item[1]))
+        return [(q, sql, round(score, 3)) for score, _, q, sql in scored[:k]]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._examples)
+
@@ -35,18 +35,18 @@ def main():
         "Show me products with revenue over 100"
     ]
     
-    for question in questions:
+    # Schema is built once, LLM calls run concurrently and duplicate SQL runs once
+    for result in assistant.analyze_batch(questions):
         print(f"\n{'='*50}")
-        print(f"Question: {question}")
+        print(f"Question: {result['question']}")
         print('='*50)
         
-        result = assistant.analyze(question)
-        
         if result['success']:
             print(f"SQL Query: {result['sql_query']}")
             print(f"Insights: {result['insights']}")
         else:
             print(f"Error: {result['error']}")
+        print(f"Timings: {result['timings']}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
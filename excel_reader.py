@@ -0,0 +1,155 @@
+import io
+import os
+import hashlib
+import threading
+import importlib.util
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Union
+
+import pandas as pd
+
+from metrics import CACHE_REQUESTS
+
+EXCEL_EXTENSIONS = {'.xlsx', '.xlsm', '.xls', '.xlsb', '.ods'}
+
+
+def fast_engine() -> Optional[str]:
+    """'calamine' (Rust reader, many times faster than openpyxl) when python-calamine is installed"""
+    if importlib.util.find_spec('python_calamine') is not None:
+        return 'calamine'
+    return None     # pandas' default: openpyxl for .xlsx, xlrd for .xls
+
+
+def column_filter(columns: Optional[Sequence[str]]):
+    """``usecols`` keeping only ``columns``; a callable, so sheets lacking some of them still parse"""
+    if not columns:
+        return None
+    wanted = {str(column).strip() for column in columns}
+    return lambda column: str(column).strip() in wanted
+
+
+# Both engines read the whole (compressed) workbook into their own structures anyway,
+# so a BytesIO copy of the upload costs little next to the parsed sheets
+def sheet_names(data, engine: Optional[str] = None) -> List[str]:
+    with pd.ExcelFile(io.BytesIO(data), engine=engine or fast_engine()) as book:
+        return list(book.sheet_names)
+
+
+def _read_sheet(data, sheet: str, columns: Optional[Sequence[str]], engine: Optional[str]) -> pd.DataFrame:
+    return pd.read_excel(io.BytesIO(data), sheet_name=sheet, usecols=column_filter(columns), engine=engine)
+
+
+class WorkbookCache:
+    """Parsed sheets keyed by workbook content hash, sheet and column selection.
+
+    Least recently used entries are dropped once the frames held exceed
+    ``max_bytes``, so re-uploading the same export costs one hash.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 2**20):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()    # key -> (DataFrame, bytes)
+        self._bytes = 0
+        self._sheet_names = OrderedDict()    # content hash -> sheet names
+        self._lock = threading.Lock()
+
+    def sheet_names(self, digest: str) -> Optional[List[str]]:
+        with self._lock:
+            if digest in self._sheet_names:
+                self._sheet_names.move_to_end(digest)
+                return self._sheet_names[digest]
+            return None
+
+    def put_sheet_names(self, digest: str, names: List[str]):
+        with self._lock:
+            self._sheet_names[digest] = names
+            while len(self._sheet_names) > 256:
+                self._sheet_names.popitem(last=False)
+
+    def get(self, key: tuple) -> Optional[pd.DataFrame]:
+        with self._lock:
+            entry = self._entries.get(key)
+            CACHE_REQUESTS.inc(cache='workbook', result='miss' if entry is None else 'hit')
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: tuple, df: pd.DataFrame):
+        size = int(df.memory_usage(deep=True).sum())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (df, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+
+WORKBOOK_CACHE = WorkbookCache()
+
+
+def workbook_sheets(data, cache: WorkbookCache = WORKBOOK_CACHE, digest: str = None) -> List[str]:
+    """Sheet names of an in-memory workbook, remembered by content hash (``digest`` if already known)"""
+    digest = digest or hashlib.sha256(data).hexdigest()
+    names = cache.sheet_names(digest) if cache is not None else None
+    if names is None:
+        names = sheet_names(data)
+        if cache is not None:
+            cache.put_sheet_names(digest, names)
+    return names
+
+
+def read_workbook(data, sheets: Sequence[Union[str, int]] = None, columns: Sequence[str] = None,
+                  max_workers: int = None, min_parallel_bytes: int = 4 * 2**20,
+                  cache: WorkbookCache = WORKBOOK_CACHE) -> Dict[str, pd.DataFrame]:
+    """Sheet name -> DataFrame for an in-memory workbook (bytes or a buffer).
+
+    ``sheets`` are names or positions (all sheets by default) and ``columns``
+    limits every sheet to those headers. Uses the fastest installed engine,
+    parses sheets of workbooks above ``min_parallel_bytes`` in a process
+    pool, one sheet per worker, and serves repeats from ``cache`` (as
+    copies, so callers may modify the frames they get).
+    """
+    engine = fast_engine()
+    digest = hashlib.sha256(data).hexdigest()
+    names = workbook_sheets(data, cache, digest)
+    if sheets is None:
+        wanted = names
+    else:
+        wanted = []
+        for sheet in sheets:
+            name = names[sheet] if isinstance(sheet, int) and -len(names) <= sheet < len(names) else sheet
+            if name not in names:
+                raise Exception(f"Sheet '{sheet}' not found; the workbook has {', '.join(names)}")
+            wanted.append(name)
+    column_key = tuple(sorted(columns)) if columns else None
+
+    frames, missing = {}, []
+    for name in wanted:
+        cached = cache.get((digest, name, column_key, engine)) if cache is not None else None
+        if cached is None:
+            missing.append(name)
+        else:
+            frames[name] = cached.copy()
+
+    workers = min(len(missing), max_workers or os.cpu_count() or 1)
+    if workers > 1 and len(data) >= min_parallel_bytes:
+        # spawn: forking a process that runs Streamlit's threads is not safe
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            content = bytes(data)
+            futures = {name: pool.submit(_read_sheet, content, name, columns, engine) for name in missing}
+            parsed = {name: future.result() for name, future in futures.items()}
+    else:
+        parsed = {name: _read_sheet(data, name, columns, engine) for name in missing}
+
+    for name, df in parsed.items():
+        if cache is not None:
+            cache.put((digest, name, column_key, engine), df.copy())
+        frames[name] = df
+    return {name: frames[name] for name in wanted}
@@ -0,0 +1,107 @@
+import io
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator, List, Union
+
+import pandas as pd
+
+from excel_reader import column_filter, read_workbook
+
+# Readers that only accept a real file; everything else parses from memory
+PATH_ONLY_EXTENSIONS = {'.xlsb'}
+
+
+class MemoryReader(io.RawIOBase):
+    """Read-only, seekable file over a buffer (``bytes``, ``memoryview``, ``file.getbuffer()``).
+
+    Reads slice the buffer instead of copying it whole the way
+    ``io.BytesIO(memoryview)`` does, so parsing an upload needs no second
+    full-size copy of it.
+    """
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast('B')
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        chunk = self._view[self._pos:self._pos + len(target)]
+        target[:len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+
+def source_name(source) -> str:
+    """File name of a path or file-like source ('' for bare buffers)"""
+    if isinstance(source, (str, os.PathLike)):
+        return os.path.basename(os.fspath(source))
+    return os.path.basename(str(getattr(source, 'name', '') or ''))
+
+
+@contextmanager
+def local_path(source, suffix: str) -> Iterator[str]:
+    """A filesystem path holding ``source``; a copy in a private temp dir that is always removed"""
+    if isinstance(source, (str, os.PathLike)):
+        yield os.fspath(source)
+        return
+    with tempfile.TemporaryDirectory(prefix='analyst_upload_') as temp_dir:
+        path = os.path.join(temp_dir, f"upload{suffix}")
+        with open(path, 'wb') as f:
+            if hasattr(source, 'read'):
+                source.seek(0)
+                shutil.copyfileobj(source, f)
+            else:
+                f.write(source)
+        yield path
+
+
+def source_buffer(source):
+    """The content of a path, file-like object or buffer as a bytes-like object, copying only when it must"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return source
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return f.read()
+    if hasattr(source, 'getbuffer'):
+        return source.getbuffer()
+    source.seek(0)
+    return source.read()
+
+
+def read_source(source: Union[str, os.PathLike, bytes, memoryview, io.IOBase], file_name: str = None,
+                sheet: Union[str, int] = 0, columns: List[str] = None) -> pd.DataFrame:
+    """Parse CSV/Excel from a path, a file-like object or an in-memory buffer.
+
+    ``file_name`` gives the format for bare buffers; paths and file objects
+    with a ``name`` (like Streamlit uploads) carry their own. Workbooks are
+    read one ``sheet`` at a time through ``excel_reader``; ``columns``
+    limits either format to those headers.
+    """
+    file_name = file_name or source_name(source)
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension in PATH_ONLY_EXTENSIONS:
+        with local_path(source, extension) as path:
+            return pd.read_excel(path, sheet_name=sheet, usecols=column_filter(columns))
+    if extension != '.csv':
+        return next(iter(read_workbook(source_buffer(source), [sheet], columns).values()))
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BufferedReader(MemoryReader(source))
+    elif hasattr(source, 'seek'):
+        source.seek(0)
+    return pd.read_csv(source, usecols=column_filter(columns))
@@ -0,0 +1,250 @@
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+
+from sql_guard import tokenize, _join
+from value_index import ValueIndex, normalize
+
+# Words that open a follow-up ("now only for Asia", "what about Europe", "sort by price")
+CUE_WORDS = {'now', 'only', 'just', 'and', 'but', 'instead', 'then', 'also', 'same', 'exclude',
+             'except', 'without', 'excluding', 'sort', 'order', 'top', 'first', 'limit', 'filter', 'keep'}
+CUE_PHRASES = ('what about', 'how about', 'same for', 'same but', 'show only', 'only show', 'restrict to')
+NEGATIONS = {'exclude', 'except', 'without', 'excluding', 'not', 'but not', 'other than'}
+DESCENDING = {'desc', 'descending', 'highest', 'largest', 'biggest', 'most', 'greatest', 'top'}
+ASCENDING = {'asc', 'ascending', 'lowest', 'smallest', 'least', 'fewest'}
+# Words a refinement may contain besides values, column names and numbers
+FILLER = {
+    'now', 'only', 'just', 'for', 'in', 'the', 'a', 'an', 'and', 'but', 'what', 'about', 'how', 'same',
+    'instead', 'then', 'also', 'show', 'me', 'it', 'that', 'those', 'these', 'them', 'results', 'result',
+    'rows', 'please', 'with', 'where', 'is', 'are', 'to', 'of', 'by', 'filter', 'keep', 'limit', 'sort',
+    'sorted', 'order', 'ordered', 'rank', 'ranked', 'first', 'top', 'exclude', 'except', 'without',
+    'excluding', 'not', 'other', 'than', 'restrict', 'again', 'ones', 'records', 'data', 'from', 'on',
+    'give', 'list', 'can', 'you', 'do', 'same', 'but', 'on', 'at', 'equal', 'equals', 'set', 'up',
+} | DESCENDING | ASCENDING
+
+CLAUSE_END = {'GROUP', 'HAVING', 'ORDER', 'LIMIT', 'OFFSET', 'WINDOW'}
+SET_OPERATORS = {'UNION', 'INTERSECT', 'EXCEPT'}
+
+
+class Refinement(NamedTuple):
+    filters: List[Tuple[str, str, List[str]]]   # (column, '=' or '<>', values)
+    order: Optional[Tuple[str, bool]]           # (column, descending)
+    limit: Optional[int]
+
+
+def is_follow_up(question: str) -> bool:
+    """Whether ``question`` reads like a change to the previous one rather than a new question"""
+    text = normalize(question)
+    words = text.split()
+    if not words:
+        return False
+    return words[0] in CUE_WORDS or text.startswith(CUE_PHRASES)
+
+
+def _match_column(phrase: str, columns: List[str]) -> Optional[str]:
+    key = normalize(phrase)
+    for column in columns:
+        if normalize(column) == key:
+            return column
+    for column in columns:
+        # "sort by sales" -> "Sales_Volume" when exactly one column starts with the phrase
+        if normalize(column).startswith(key + ' ') and sum(normalize(c).startswith(key + ' ') for c in columns) == 1:
+            return column
+    return None
+
+
+def parse_refinement(question: str, value_index: ValueIndex, table_columns: Dict[str, List[str]],
+                     result_columns: List[str], sql: str = None) -> Optional[Refinement]:
+    """Filters, sort and limit the follow-up asks for, or None unless that is all it asks for.
+
+    ``table_columns`` maps the tables the previous SQL read to their
+    columns; filters come from their indexed values. Sorting is limited to
+    ``result_columns``, what the user actually sees. Every non-filler word
+    must be explained by a value, a column or a number, so "now the average
+    price by model" goes back to the LLM. Limits are "top/first/limit N" or
+    "only/just N rows"; "now only 2020" is left to the LLM. "top 3" or
+    "first 3" needs an order, from the follow-up or the previous ``sql``;
+    without one the LLM has to decide what "top" means.
+    """
+    if not is_follow_up(question):
+        return None
+    text = normalize(question)
+    words = text.split()
+    explained = [word in FILLER for word in words]
+    starts, pos = [], 0
+    for word in words:
+        starts.append(pos)
+        pos += len(word) + 1
+
+    def explain(begin: int, end: int):
+        for i, start in enumerate(starts):
+            if begin <= start < end:
+                explained[i] = True
+
+    limit, ranked = None, False
+    # "only 5" is a limit only with a row noun: "now only 2020" filters on a year
+    match = re.search(r'\b(top|first|limit|limit to) (\d+)\b', text) or \
+        re.search(r'\b(only|just) (\d+) (?=(?:rows|results|records)\b)', text)
+    if match:
+        row_noun = re.match(r' ?(?:rows|results|records)\b', text[match.end():])
+        if re.fullmatch(r'(?:19|20)\d\d', match.group(2)) and not row_noun:
+            return None     # "first 2020" is more likely a year than a row count
+        limit = int(match.group(2))
+        ranked = match.group(1) in ('top', 'first')
+        explain(match.start(2), match.end(2))
+
+    order = None
+    match = re.search(r'\b(?:sort|sorted|order|ordered|rank|ranked)(?: \w+)? by (.+)$', text)
+    if match:
+        phrase = match.group(1).split()
+        direction = set()
+        while phrase and (phrase[-1] in DESCENDING | ASCENDING or phrase[-1] == 'first'):
+            direction.add(phrase.pop())
+        column = _match_column(' '.join(phrase), result_columns) if phrase else None
+        if column is None:
+            return None
+        order = (column, bool(direction & DESCENDING))
+        explain(match.start(1), match.start(1) + len(' '.join(phrase)))
+    elif limit and set(words) & (DESCENDING | ASCENDING) - {'top'}:
+        return None     # "top 5 lowest" needs a sort column we can't name
+    elif ranked and not (sql and 'ORDER' in {word for _, word in _outer_words([t for _, t in tokenize(sql)])}):
+        return None     # an unordered LIMIT would return arbitrary rows, not the top ones
+
+    by_column: Dict[str, list] = {}
+    span_columns: Dict[tuple, set] = {}
+    last_end, last_op = None, None
+    for begin, end, table, column, value in value_index.lookup(question):
+        if table not in table_columns:
+            continue
+        # A column present in several joined tables would need a qualifier
+        if sum(column in columns for columns in table_columns.values()) > 1:
+            return None
+        span_columns.setdefault((begin, end), set()).add(column)
+        before = text[:begin].split()[-2:]
+        negated = bool(set(before) & NEGATIONS) or ' '.join(before) in NEGATIONS
+        op = '<>' if negated else '='
+        # "exclude Asia and Europe": the negation covers the whole list
+        if last_op and set(text[last_end:begin].split()) <= {'and', 'or', 'nor'}:
+            op = last_op
+        last_end, last_op = end, op
+        if column in by_column and by_column[column][0] != op:
+            return None
+        by_column.setdefault(column, [op, []])
+        if value not in by_column[column][1]:
+            by_column[column][1].append(value)
+        explain(begin, end)
+    # A phrase matching several columns is ambiguous
+    if any(len(columns) > 1 for columns in span_columns.values()):
+        return None
+
+    if not all(explained) or not (by_column or order or limit):
+        return None
+    filters = [(column, op, values) for column, (op, values) in by_column.items()]
+    return Refinement(filters, order, limit)
+
+
+def _quote(column: str) -> str:
+    return '`' + column.replace('`', '``') + '`'
+
+
+def _literal(value: str) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _predicate(column: str, op: str, values: List[str]) -> List[str]:
+    if len(values) == 1:
+        return [_quote(column), op, _literal(values[0])]
+    parts = [_quote(column), 'NOT IN' if op == '<>' else 'IN', '(']
+    for i, value in enumerate(values):
+        parts += ([','] if i else []) + [_literal(value)]
+    return parts + [')']
+
+
+def _outer_words(parts: List[str]) -> List[Tuple[int, str]]:
+    """(index, upper-cased word) of the words outside any parentheses"""
+    top, depth = [], 0
+    for i, part in enumerate(parts):
+        if part == '(':
+            depth += 1
+        elif part == ')':
+            depth -= 1
+        elif depth == 0 and re.match(r'[A-Za-z_]', part):
+            top.append((i, part.upper()))
+    return top
+
+
+def refine_sql(sql: str, refinement: Refinement) -> Optional[str]:
+    """``sql`` with the refinement's predicates, ORDER BY and LIMIT applied to the outer query.
+
+    Returns None for shapes that can't be edited safely (UNION and friends).
+    """
+    parts = [text for _, text in tokenize(sql.strip().rstrip(';'))]
+    top = _outer_words(parts)
+    keywords = [word for _, word in top]
+    if 'FROM' not in keywords or set(keywords) & SET_OPERATORS:
+        return None
+    from_index = max(i for i, word in top if word == 'FROM')
+
+    def first(names, after=from_index):
+        return min((i for i, word in top if word in names and i > after), default=len(parts))
+
+    if refinement.filters:
+        predicate = []
+        for column, op, values in refinement.filters:
+            predicate += (['AND'] if predicate else []) + _predicate(column, op, values)
+        where = first({'WHERE'})
+        if where < len(parts):
+            end = first(CLAUSE_END, where)
+            parts = parts[:where + 1] + ['('] + parts[where + 1:end] + [')', 'AND'] + predicate + parts[end:]
+        else:
+            end = first(CLAUSE_END)
+            parts = parts[:end] + ['WHERE'] + predicate + parts[end:]
+        return refine_sql(_join(parts), refinement._replace(filters=[]))
+
+    if refinement.order:
+        column, descending = refinement.order
+        start = first({'ORDER'})
+        end = first({'LIMIT', 'OFFSET'}, start) if start < len(parts) else start
+        clause = ['ORDER', 'BY', _quote(column)] + (['DESC'] if descending else [])
+        if start == len(parts):
+            start = end = first({'LIMIT', 'OFFSET'})
+        parts = parts[:start] + clause + parts[end:]
+
+    if refinement.limit:
+        start = first({'LIMIT'})
+        end = first({'OFFSET'}, start) if start < len(parts) else len(parts)
+        if start < len(parts) and end == len(parts):
+            end = start + 2
+            if end < len(parts) and parts[end] == ',':
+                end += 2    # MySQL "LIMIT offset, count"
+        parts = parts[:start] + ['LIMIT', str(refinement.limit)] + parts[end:]
+    return _join(parts)
+
+
+def refine_frame(df: pd.DataFrame, refinement: Refinement, sql: str) -> Optional[pd.DataFrame]:
+    """The refinement applied to the complete result ``df`` of ``sql``, or None when that would differ from re-running it.
+
+    Filtering or re-sorting the rows a LIMIT kept is not the same as
+    filtering before the LIMIT, and window functions see every row, so
+    those cases (and columns missing from ``df``) go back to the database.
+    """
+    tokens = tokenize(sql)
+    words = {text.upper() for kind, text in tokens if kind == 'word'}
+    limited = 'LIMIT' in {word for _, word in _outer_words([text for _, text in tokens])}
+    if 'OVER' in words or (limited and (refinement.filters or refinement.order)):
+        return None
+    needed = [column for column, _, _ in refinement.filters]
+    if refinement.order:
+        needed.append(refinement.order[0])
+    if any(column not in df.columns for column in needed):
+        return None
+    for column, op, values in refinement.filters:
+        mask = df[column].astype(str).str.strip().isin([str(value) for value in values])
+        df = df[~mask if op == '<>' else mask]
+    if refinement.order:
+        column, descending = refinement.order
+        df = df.sort_values(column, ascending=not descending, kind='stable')
+    if refinement.limit:
+        df = df.head(refinement.limit)
+    return df.reset_index(drop=True)
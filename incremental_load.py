@@ -0,0 +1,59 @@
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import pandas as pd
+
+
+class TableDelta(NamedTuple):
+    inserts: pd.DataFrame       # rows to append
+    delete_keys: List[Any]      # key values whose stored rows are removed first (changed or gone)
+    replace: bool               # the file can't be expressed as a delta: reload the whole table
+    unchanged: int              # rows already stored as they are
+
+
+def fingerprint(df: pd.DataFrame, key: Optional[str] = None) -> Dict[str, Any]:
+    """What a later load needs to diff against: columns, dtypes and one 64-bit hash per row.
+
+    With ``key`` the hashes are indexed by the key column, otherwise by position.
+    """
+    hashes = pd.util.hash_pandas_object(df, index=False)
+    if key is not None:
+        hashes.index = df[key].to_numpy()
+    return {
+        'columns': list(df.columns),
+        'dtypes': [str(dtype) for dtype in df.dtypes],
+        'key': key,
+        'hashes': hashes,
+    }
+
+
+def diff_table(previous: Dict[str, Any], df: pd.DataFrame, key: Optional[str] = None) -> TableDelta:
+    """Delta that turns the table ``previous`` fingerprinted into ``df``.
+
+    Without a key only appends are recognised: the stored rows must be an
+    exact prefix of the new file. With a key (unique in both versions) new
+    keys are inserted, changed rows are deleted and re-inserted and keys
+    missing from the file are deleted, as the file is a full export.
+    Anything else (new columns, changed types, a different key) is a replace.
+    """
+    replace = TableDelta(df, [], True, 0)
+    if (not previous or list(df.columns) != previous['columns']
+            or [str(dtype) for dtype in df.dtypes] != previous['dtypes'] or previous['key'] != key):
+        return replace
+    old = previous['hashes']
+    new = pd.util.hash_pandas_object(df, index=False)
+
+    if key is None:
+        if len(new) < len(old) or not (new.to_numpy()[:len(old)] == old.to_numpy()).all():
+            return replace
+        return TableDelta(df.iloc[len(old):], [], False, len(old))
+
+    keys = df[key]
+    if keys.isna().any() or not keys.is_unique or not old.index.is_unique:
+        return replace
+    new.index = keys.to_numpy()
+    common = new.index.intersection(old.index)
+    changed = common[new[common].to_numpy() != old[common].to_numpy()]
+    added = new.index.difference(old.index)
+    removed = old.index.difference(new.index)
+    inserts = df[keys.isin(added.append(changed))]
+    return TableDelta(inserts, removed.append(changed).tolist(), False, len(common) - len(changed))
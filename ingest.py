@@ -0,0 +1,38 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterator, List, Optional, Tuple, Union
+
+import pandas as pd
+
+from table_store import read_table
+
+
+def parse_uploads(uploads: List[tuple], max_workers: Optional[int] = None,
+                  min_parallel_bytes: int = 64 * 2**20) -> Iterator[Tuple[int, Union[pd.DataFrame, Exception]]]:
+    """Parse (file name, content[, sheet, columns]) tuples, yielding (position, DataFrame or the exception) as each finishes.
+
+    Several files totalling at least ``min_parallel_bytes`` are parsed in a
+    process pool, one file per worker, so CSV/Excel parsing isn't held to a
+    single core; smaller batches are parsed in this process, where starting
+    workers would cost more than it saves.
+    """
+    total = sum(len(data) for _, data, *_ in uploads)
+    workers = min(len(uploads), max_workers or os.cpu_count() or 1)
+    if workers < 2 or total < min_parallel_bytes:
+        for position, (file_name, data, *options) in enumerate(uploads):
+            try:
+                yield position, read_table(data, file_name, *options)
+            except Exception as e:
+                yield position, e
+        return
+
+    # spawn: forking a process that runs Streamlit's threads is not safe
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = {pool.submit(read_table, bytes(data), file_name, *options): position
+                   for position, (file_name, data, *options) in enumerate(uploads)}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result()
+            except Exception as e:
+                yield futures[future], e
@@ -0,0 +1,176 @@
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, Tuple
+
+LANGUAGE_NAMES = {
+    'en': 'English', 'es': 'Spanish', 'fr': 'French', 'de': 'German', 'it': 'Italian',
+    'pt': 'Portuguese', 'nl': 'Dutch', 'hi': 'Hindi', 'ar': 'Arabic', 'ru': 'Russian',
+    'zh': 'Chinese', 'ja': 'Japanese', 'ko': 'Korean', 'el': 'Greek', 'he': 'Hebrew',
+    'th': 'Thai', 'bn': 'Bengali', 'ta': 'Tamil',
+}
+
+# Scripts used by a single language in practice: one character settles it
+SCRIPT_LANGUAGES = [
+    ('HIRAGANA', 'ja'), ('KATAKANA', 'ja'), ('HANGUL', 'ko'), ('DEVANAGARI', 'hi'),
+    ('BENGALI', 'bn'), ('TAMIL', 'ta'), ('ARABIC', 'ar'), ('HEBREW', 'he'), ('THAI', 'th'),
+    ('GREEK', 'el'), ('CYRILLIC', 'ru'), ('CJK', 'zh'),
+]
+
+# Small seed corpora in the register of data questions; trigram profiles are built from them at import
+SEED_TEXT = {
+    'en': """what is the total revenue by region and which product sold the most units last year
+show me the top ten customers with the highest sales in the north and south
+how many orders were placed each month, what was the average price of the cars
+list all employees whose salary is above the average for their department
+which country has the lowest profit and how does it compare with the previous quarter
+give me the number of movies released per year and the count of shows by rating
+find the best selling model, the sum of sales volume, the mean mileage of these vehicles
+compare this with that, there are more of them than we thought, it would be good to know
+where when why who which with from into over under between during after before about""",
+    'es': """cuál es el total de ventas por región y qué producto vendió más unidades el año pasado
+muéstrame los diez clientes con las ventas más altas en el norte y en el sur
+cuántos pedidos se hicieron cada mes, cuál fue el precio promedio de los coches
+lista todos los empleados cuyo salario está por encima del promedio de su departamento
+qué país tiene la menor ganancia y cómo se compara con el trimestre anterior
+dame el número de películas estrenadas por año y la cantidad de programas por clasificación
+encuentra el modelo más vendido, la suma del volumen de ventas y el kilometraje medio
+dónde cuándo por qué quién cuáles con desde hasta sobre entre durante después antes""",
+    'fr': """quel est le chiffre d'affaires total par région et quel produit a vendu le plus d'unités l'année dernière
+montre-moi les dix clients avec les ventes les plus élevées dans le nord et le sud
+combien de commandes ont été passées chaque mois, quel était le prix moyen des voitures
+liste tous les employés dont le salaire est supérieur à la moyenne de leur service
+quel pays a le bénéfice le plus faible et comment se compare-t-il au trimestre précédent
+donne-moi le nombre de films sortis par an et le nombre d'émissions par classement
+trouve le modèle le plus vendu, la somme du volume des ventes et le kilométrage moyen
+où quand pourquoi qui lesquels avec depuis jusqu'à sur entre pendant après avant""",
+    'de': """wie hoch ist der gesamtumsatz nach region und welches produkt hat letztes jahr die meisten einheiten verkauft
+zeig mir die zehn kunden mit den höchsten umsätzen im norden und im süden
+wie viele bestellungen wurden jeden monat aufgegeben, wie hoch war der durchschnittspreis der autos
+liste alle mitarbeiter auf, deren gehalt über dem durchschnitt ihrer abteilung liegt
+welches land hat den niedrigsten gewinn und wie ist der vergleich mit dem vorherigen quartal
+gib mir die anzahl der filme pro jahr und die anzahl der sendungen nach bewertung
+finde das meistverkaufte modell, die summe des verkaufsvolumens und die durchschnittliche laufleistung
+wo wann warum wer welche mit von bis über zwischen während nach vor nicht und oder""",
+    'it': """qual è il fatturato totale per regione e quale prodotto ha venduto più unità l'anno scorso
+mostrami i dieci clienti con le vendite più alte nel nord e nel sud
+quanti ordini sono stati effettuati ogni mese, qual era il prezzo medio delle auto
+elenca tutti i dipendenti il cui stipendio è superiore alla media del loro reparto
+quale paese ha il profitto più basso e come si confronta con il trimestre precedente
+dammi il numero di film usciti per anno e il numero di programmi per valutazione
+trova il modello più venduto, la somma del volume di vendite e il chilometraggio medio
+dove quando perché chi quali con da fino a su tra durante dopo prima della delle degli""",
+    'pt': """qual é a receita total por região e qual produto vendeu mais unidades no ano passado
+mostre-me os dez clientes com as maiores vendas no norte e no sul
+quantos pedidos foram feitos em cada mês, qual foi o preço médio dos carros
+liste todos os funcionários cujo salário está acima da média do seu departamento
+qual país tem o menor lucro e como ele se compara com o trimestre anterior
+me dê o número de filmes lançados por ano e a quantidade de programas por classificação
+encontre o modelo mais vendido, a soma do volume de vendas e a quilometragem média
+onde quando por que quem quais com desde até sobre entre durante depois antes não são""",
+    'nl': """wat is de totale omzet per regio en welk product heeft vorig jaar de meeste eenheden verkocht
+laat me de tien klanten zien met de hoogste verkopen in het noorden en het zuiden
+hoeveel bestellingen zijn er elke maand geplaatst, wat was de gemiddelde prijs van de auto's
+geef een lijst van alle werknemers van wie het salaris boven het gemiddelde van hun afdeling ligt
+welk land heeft de laagste winst en hoe verhoudt het zich tot het vorige kwartaal
+geef me het aantal films per jaar en het aantal programma's per beoordeling
+vind het best verkochte model, de som van het verkoopvolume en de gemiddelde kilometerstand
+waar wanneer waarom wie welke met van tot over tussen tijdens na voor niet en of het een""",
+}
+
+# Log-odds added to English for all-ASCII text; foreign questions score 8+ nats ahead even when short
+ENGLISH_ASCII_PRIOR = 4.0
+
+_NON_LETTERS = re.compile(r"[^\w']+|[\d_]+")
+
+
+def _trigrams(text: str) -> Counter:
+    words = _NON_LETTERS.sub(' ', text.lower()).split()
+    grams = Counter()
+    for word in words:
+        padded = f" {word} "
+        for i in range(len(padded) - 2):
+            grams[padded[i:i + 3]] += 1
+    return grams
+
+
+def _build_profiles() -> Tuple[Dict[str, Dict[str, float]], Dict[str, float]]:
+    counts = {code: _trigrams(text) for code, text in SEED_TEXT.items()}
+    vocabulary = set().union(*counts.values())
+    profiles, unseen = {}, {}
+    for code, grams in counts.items():
+        # Add-one smoothed log probabilities
+        denominator = sum(grams.values()) + len(vocabulary) + 1
+        profiles[code] = {gram: math.log((count + 1) / denominator) for gram, count in grams.items()}
+        unseen[code] = math.log(1 / denominator)
+    return profiles, unseen
+
+
+PROFILES, UNSEEN = _build_profiles()
+
+
+def script_language(text: str) -> Tuple[str, float]:
+    """Language implied by non-Latin script characters, with the share of letters in that script"""
+    letters, votes = 0, Counter()
+    for char in text:
+        if not char.isalpha():
+            continue
+        letters += 1
+        if ord(char) < 0x250:       # Basic Latin through Latin Extended-B
+            continue
+        name = unicodedata.name(char, '')
+        for script, code in SCRIPT_LANGUAGES:
+            if name.startswith(script):
+                votes[code] += 1
+                break
+    if not votes:
+        return '', 0.0
+    # Kana anywhere means Japanese even though most characters are kanji
+    if votes['ja'] and votes['zh']:
+        votes['ja'] += votes.pop('zh')
+    code, count = votes.most_common(1)[0]
+    return code, count / letters
+
+
+def _posteriors(text: str) -> Dict[str, float]:
+    """Probability of each seed language for Latin-script ``text``; empty when it has no letters"""
+    grams = _trigrams(text)
+    if not grams:
+        return {}
+    scores = {}
+    for language, profile in PROFILES.items():
+        unseen = UNSEEN[language]
+        scores[language] = sum(profile.get(gram, unseen) * count for gram, count in grams.items())
+    if text.isascii():
+        # Short English follow-ups ("now only for Asia") have too few trigrams to beat Romance
+        # languages on their own; unaccented text gets a prior that real foreign text outweighs
+        scores['en'] += ENGLISH_ASCII_PRIOR
+    # Posterior, tempered by length so a few trigrams don't look certain
+    n = sum(grams.values())
+    temperature = max(1.0, 12.0 / n)
+    top = max(scores.values())
+    weights = {language: math.exp((score - top) / temperature) for language, score in scores.items()}
+    total = sum(weights.values())
+    return {language: weight / total for language, weight in weights.items()}
+
+
+def detect(text: str) -> Tuple[str, float]:
+    """(ISO 639-1 code, confidence in [0, 1]) for ``text``; ('en', 0.0) when there is nothing to go on"""
+    code, share = script_language(text)
+    if code and share >= 0.3:
+        return code, min(1.0, 0.5 + share)
+
+    posteriors = _posteriors(text)
+    if not posteriors:
+        return 'en', 0.0
+    best = max(posteriors, key=posteriors.get)
+    return best, posteriors[best]
+
+
+def english_probability(text: str) -> float:
+    """How likely ``text`` is English; 1.0 when there is nothing to go on"""
+    code, share = script_language(text)
+    if code and share >= 0.3:
+        return 0.0
+    return _posteriors(text).get('en', 1.0)
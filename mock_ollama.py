@@ -0,0 +1,95 @@
+import re
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, List, Tuple, Union
+
+Response = Union[str, Callable[[re.Match], str]]
+
+
+class MockOllama:
+    """Local stand-in for Ollama's ``/api/generate`` with scripted answers.
+
+    ``script`` is a list of ``(pattern, response)`` pairs tried in order
+    against the prompt; the first regex that matches wins. A response is a
+    string or a callable taking the match. Every request sleeps ``latency``
+    seconds first, and replies carry Ollama's token-count fields so callers
+    that read them see realistic values.
+
+        with MockOllama(latency=0.2, script=[(r'QUESTION: count', 'SELECT COUNT(*) FROM t')]) as mock:
+            analyst = OptimizedDataAnalyst(mock.url)
+    """
+
+    def __init__(self, latency: float = 0.0, script: List[Tuple[str, Response]] = None,
+                 default: str = "OK", host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.script = [(re.compile(pattern, re.IGNORECASE | re.DOTALL), response)
+                       for pattern, response in (script or [])]
+        self.default = default
+        self.requests = []      # (model, prompt) of every call, in arrival order
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def respond(self, prompt: str) -> str:
+        for pattern, response in self.script:
+            match = pattern.search(prompt)
+            if match:
+                return response(match) if callable(response) else response
+        return self.default
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path.rstrip('/') != '/api/generate':
+                    self.send_error(404)
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                prompt = body.get('prompt', '')
+                with mock._lock:
+                    mock.requests.append((body.get('model'), prompt))
+                started = time.perf_counter()
+                time.sleep(mock.latency)
+                text = mock.respond(prompt)
+                payload = json.dumps({
+                    'model': body.get('model'),
+                    'response': text,
+                    'done': True,
+                    'prompt_eval_count': len(prompt.split()),
+                    'eval_count': len(text.split()),
+                    'total_duration': int((time.perf_counter() - started) * 1e9)
+                }).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> 'MockOllama':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'MockOllama':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,155 @@
+import os
+import math
+import time
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import requests
+
+DEFAULT_CHAINS = {
+    'sql': ['sqlcoder', 'llama3'],
+    'translation': ['llama3'],
+    'insights': ['llama3'],
+}
+
+
+class ModelRouter:
+    """Picks the Ollama model for each task and falls back along a chain.
+
+    Every task has a fallback chain of models. Cheap tasks (``cheap_tasks``)
+    with short prompts try ``small_models`` first (``ANALYST_SMALL_MODELS``,
+    comma-separated, by default). Within the chain, models are ordered by
+    observed latency for the task, with a penalty for models that are not
+    currently loaded (Ollama stalls while it swaps models). Models whose
+    recent success rate dropped below ``min_success_rate`` go to the back
+    until ``cooldown_seconds`` after their last failure, then get retried.
+    Models that have never answered are assumed to be as fast as the best
+    measured one, so a fast fallback can't lock out the rest of the chain.
+    """
+
+    def __init__(self, ollama_url: str = "http://localhost:11434", chains: Dict[str, List[str]] = None,
+                 small_models: List[str] = None, cheap_tasks: tuple = ('translation',),
+                 small_prompt_chars: int = 400, swap_penalty: float = 5.0, keep_alive_seconds: float = 300,
+                 window: int = 20, min_success_rate: float = 0.5, cooldown_seconds: float = 60,
+                 timeout: float = 120, keep_alive: str = "30m"):
+        self.ollama_url = ollama_url
+        self.chains = {**DEFAULT_CHAINS, **(chains or {})}
+        if small_models is None:
+            small_models = [m.strip() for m in os.environ.get('ANALYST_SMALL_MODELS', '').split(',') if m.strip()]
+        self.small_models = list(small_models)
+        self.cheap_tasks = set(cheap_tasks)
+        self.small_prompt_chars = small_prompt_chars
+        self.swap_penalty = swap_penalty
+        self.keep_alive_seconds = keep_alive_seconds   # how long a model counts as warm after its last reply
+        self.window = window
+        self.min_success_rate = min_success_rate
+        self.cooldown_seconds = cooldown_seconds
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self._history = {}      # (model, task) -> deque of (ok, seconds)
+        self._last_used = {}    # model -> monotonic time of its last response
+        self._last_failure = {}     # (model, task) -> monotonic time of its last failed call
+        self._lock = threading.Lock()
+
+    def candidates(self, task: str, prompt: str) -> List[str]:
+        chain = list(self.chains.get(task, self.chains['insights']))
+        if task in self.cheap_tasks and len(prompt) <= self.small_prompt_chars:
+            chain = self.small_models + [model for model in chain if model not in self.small_models]
+        return list(dict.fromkeys(chain))
+
+    def is_warm(self, model: str) -> bool:
+        with self._lock:
+            last = self._last_used.get(model)
+        return last is not None and time.monotonic() - last < self.keep_alive_seconds
+
+    def stats(self, model: str, task: str) -> Dict[str, Any]:
+        with self._lock:
+            history = list(self._history.get((model, task), ()))
+        if not history:
+            return {'calls': 0, 'success_rate': None, 'latency': None}
+        latencies = [seconds for ok, seconds in history if ok]
+        return {
+            'calls': len(history),
+            'success_rate': sum(ok for ok, _ in history) / len(history),
+            'latency': sum(latencies) / len(latencies) if latencies else None,
+        }
+
+    def model_latency(self, model: str) -> float:
+        """Mean successful latency of ``model`` across all tasks (inf if never used)"""
+        with self._lock:
+            latencies = [seconds for (name, _), history in self._history.items() if name == model
+                         for ok, seconds in history if ok]
+        return sum(latencies) / len(latencies) if latencies else math.inf
+
+    def is_unhealthy(self, model: str, task: str) -> bool:
+        """Failing too often for ``task`` and still inside the cooldown after its last failure"""
+        stats = self.stats(model, task)
+        if stats['calls'] < 3 or stats['success_rate'] >= self.min_success_rate:
+            return False
+        with self._lock:
+            failed = self._last_failure.get((model, task))
+        return failed is not None and time.monotonic() - failed < self.cooldown_seconds
+
+    def route(self, task: str, prompt: str) -> List[str]:
+        """Models to try for this call, best first"""
+        chain = self.candidates(task, prompt)
+        any_warm = any(self.is_warm(model) for model in chain)
+        latencies = {}
+        for model in chain:
+            # Not yet used for this task: judge by its latency on other tasks
+            stats = self.stats(model, task)
+            latencies[model] = stats['latency'] if stats['latency'] is not None else self.model_latency(model)
+        measured = [latency for latency in latencies.values() if latency != math.inf]
+        best = min(measured) if measured else 0.0
+
+        def score(position_model):
+            position, model = position_model
+            unhealthy = self.is_unhealthy(model, task)
+            latency = latencies[model]
+            if latency == math.inf:
+                # Never answered: assume it is as fast as the best model so it still gets tried
+                # (in configured order) until it succeeds or turns unhealthy
+                latency = best
+            elif any_warm and not self.is_warm(model):
+                latency += self.swap_penalty
+            return (unhealthy, latency, position)
+
+        return [model for _, model in sorted(enumerate(chain), key=score)]
+
+    def record(self, model: str, task: str, ok: bool, seconds: float):
+        with self._lock:
+            history = self._history.setdefault((model, task), deque(maxlen=self.window))
+            history.append((ok, seconds))
+            if ok:
+                self._last_used[model] = time.monotonic()
+            else:
+                self._last_failure[(model, task)] = time.monotonic()
+
+    def generate(self, task: str, prompt: str, options: Dict[str, Any] = None,
+                 format: Any = None) -> Optional[Dict[str, Any]]:
+        """POST /api/generate along the routed chain; the first non-empty response wins.
+
+        ``format`` is passed through to Ollama ("json" or a JSON schema). Returns
+        Ollama's response JSON with ``model`` set to the model that answered, or
+        None when every model failed.
+        """
+        for model in self.route(task, prompt):
+            start = time.monotonic()
+            try:
+                payload = {"model": model, "prompt": prompt, "stream": False, "keep_alive": self.keep_alive}
+                if options:
+                    payload["options"] = options
+                if format:
+                    payload["format"] = format
+                response = requests.post(f"{self.ollama_url}/api/generate", json=payload, timeout=self.timeout)
+                if response.status_code == 200:
+                    result = response.json()
+                    if result and result.get("response"):
+                        self.record(model, task, True, time.monotonic() - start)
+                        result['model'] = model
+                        return result
+            except Exception:
+                pass
+            self.record(model, task, False, time.monotonic() - start)
+        return None
@@ -0,0 +1,95 @@
+import time
+import threading
+from typing import Any, Dict, List, Union
+
+import requests
+
+
+class WarmupManager:
+    """Preloads Ollama models at startup and keeps them resident.
+
+    Each model is loaded with an empty-prompt ``/api/generate`` call carrying
+    ``keep_alive``, so the first user question doesn't pay the load time.
+    A background thread then re-pings every ``ping_interval`` seconds, which
+    resets Ollama's unload timer, and checks ``/api/ps`` so ``status``
+    reflects what is actually in memory.
+    """
+
+    def __init__(self, ollama_url: str = "http://localhost:11434", models: List[str] = None,
+                 keep_alive: Union[str, int] = "30m", ping_interval: float = 240, timeout: float = 300):
+        self.ollama_url = ollama_url
+        self.models = list(models or ["llama3"])
+        self.keep_alive = keep_alive
+        self.ping_interval = ping_interval
+        self.timeout = timeout
+        self._status = {model: {'state': 'pending'} for model in self.models}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _update(self, model: str, **fields):
+        with self._lock:
+            self._status.setdefault(model, {}).update(fields)
+
+    def ping(self, model: str) -> bool:
+        """Load ``model`` (or extend its residency) without generating anything"""
+        start = time.monotonic()
+        try:
+            response = requests.post(f"{self.ollama_url}/api/generate", json={
+                "model": model,
+                "prompt": "",
+                "stream": False,
+                "keep_alive": self.keep_alive
+            }, timeout=self.timeout)
+            if response.status_code == 200:
+                self._update(model, state='ready', last_ping=time.time(),
+                             ping_seconds=round(time.monotonic() - start, 3), error=None)
+                return True
+            self._update(model, state='error', error=f"HTTP {response.status_code}: {response.text[:200]}")
+        except Exception as e:
+            self._update(model, state='error', error=str(e))
+        return False
+
+    def loaded_models(self) -> List[str]:
+        """Models Ollama currently holds in memory, from ``/api/ps``"""
+        try:
+            response = requests.get(f"{self.ollama_url}/api/ps", timeout=5)
+            if response.status_code == 200:
+                return [entry.get('name', entry.get('model', '')) for entry in response.json().get('models', [])]
+        except Exception:
+            pass
+        return []
+
+    def _run(self):
+        for model in self.models:
+            if self._stop.is_set():
+                return
+            self._update(model, state='loading')
+            start = time.monotonic()
+            if self.ping(model):
+                self._update(model, load_seconds=round(time.monotonic() - start, 3))
+
+        while not self._stop.wait(self.ping_interval):
+            loaded = self.loaded_models()
+            for model in self.models:
+                # Ollama names models with a tag ("llama3:latest")
+                if loaded and not any(name == model or name.startswith(f"{model}:") for name in loaded):
+                    self._update(model, state='loading')
+                self.ping(model)
+
+    def start(self) -> 'WarmupManager':
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True, name='ollama-warmup')
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {model: dict(info) for model, info in self._status.items()}
+
+    def is_ready(self) -> bool:
+        return all(info.get('state') == 'ready' for info in self.status().values())
@@ -1,16 +1,28 @@
 import pandas as pd
-import sqlite3
-import requests
-from typing import Dict, Any
+from typing import Dict, Any, List
 import os
 import json
 import re
+from rule_based_sql import RuleBasedSQL
+from value_index import ValueIndex
+from sql_guard import SQLGuard, tables_in_sql
+from sqlite_pool import SQLiteConnectionManager
+from model_router import ModelRouter
+from batch_analysis import run_batch
+from example_store import ExampleStore, table_signature
 
 class OptimizedDataAnalyst:
-    def __init__(self, ollama_url: str = "http://localhost:11434"):
+    def __init__(self, ollama_url: str = "http://localhost:11434", example_store: ExampleStore = None,
+                 router: ModelRouter = None):
         self.ollama_url = ollama_url
-        self.db_connection = sqlite3.connect(':memory:', check_same_thread=False)
+        self.router = router or ModelRouter(ollama_url)
+        self.examples = example_store if example_store is not None else ExampleStore()
+        self.example_count = 3
+        self.db = SQLiteConnectionManager()
         self.tables = {}
+        self.value_index = ValueIndex()
+        self.sql_guard = SQLGuard()
+        self.rule_engine = RuleBasedSQL(self.tables, self.value_index)
         
     def load_file(self, file_path: str, table_name: str = None) -> str:
         if not table_name:
@@ -21,12 +33,16 @@ class OptimizedDataAnalyst:
         else:
             df = pd.read_excel(file_path)
             
-        df.to_sql(table_name, self.db_connection, if_exists='replace', index=False)
+        with self.db.writer() as connection:
+            df.to_sql(table_name, connection, if_exists='replace', index=False)
+        self.value_index.add_table(table_name, df)
         
         self.tables[table_name] = {
             'columns': list(df.columns),
             'sample_data': df.head(3).to_dict('records'),
-            'row_count': len(df)
+            'row_count': len(df),
+            'numeric_columns': [col for col in df.columns if pd.api.types.is_numeric_dtype(df[col])],
+            'signature': table_signature(table_name, df.columns)
         }
         
         return f"Loaded {len(df)} rows into table '{table_name}'"
@@ -56,8 +72,8 @@ class OptimizedDataAnalyst:
         
         sql = ' '.join(lines)
         
-        # Ensure it starts with SELECT, INSERT, UPDATE, DELETE
-        if not re.match(r'^\s*(SELECT|INSERT|UPDATE|DELETE)', sql, re.IGNORECASE):
+        # Ensure it starts with a read-only SELECT / WITH
+        if not re.match(r'^\s*(SELECT|WITH)', sql, re.IGNORECASE):
             # Try to find SQL in the text
             sql_match = re.search(r'(SELECT.*?(?:;|$))', sql, re.IGNORECASE | re.DOTALL)
             if sql_match:
@@ -65,16 +81,43 @@ class OptimizedDataAnalyst:
         
         return sql.strip()
     
-    def nl_to_sql(self, question: str) -> str:
-        schema = self.get_enhanced_schema()
+    def examples_for(self, question: str) -> str:
+        """The most similar accepted examples for the loaded tables, or generic ones on a cold start"""
+        signatures = [info['signature'] for info in self.tables.values()]
+        similar = self.examples.similar(question, signatures, self.example_count)
+        if similar:
+            return '\n'.join(f'- "{q}" → {sql.rstrip(";")};' for q, sql, _ in similar)
+        table = list(self.tables.keys())[0]
+        return f"""- "show all data" → SELECT * FROM {table};
+- "count rows" → SELECT COUNT(*) FROM {table};
+- "top 5 by revenue" → SELECT * FROM {table} ORDER BY revenue DESC LIMIT 5;"""
+    
+    def accept_result(self, result: Dict[str, Any]):
+        """Record an answer the user accepted as a few-shot example for similar questions"""
+        if not result.get('success'):
+            return
+        # A guessed query would teach the model to answer similar questions the same wrong way
+        if result['sql_query'] == self.fallback_sql(result['question']):
+            return
+        used = tables_in_sql(result['sql_query'], self.tables)
+        if used:
+            self.examples.add(result['question'], result['sql_query'], [self.tables[t]['signature'] for t in used])
+    
+    def nl_to_sql(self, question: str, schema: str = None) -> str:
+        schema = schema or self.get_enhanced_schema()
         table_names = list(self.tables.keys())
         
         if not table_names:
             raise Exception("No tables loaded. Please upload a file first.")
         
+        # Simple questions are answered by templates without touching the LLM
+        fast_sql = self.rule_engine.translate(question)
+        if fast_sql:
+            return fast_sql
+        
         # Enhanced prompt with examples
         prompt = f"""{schema}
-
+{self.value_index.prompt_hints(question)}
 You are a SQL expert. Convert the natural language question to SQL.
 
 QUESTION: {question}
@@ -87,33 +130,22 @@ CRITICAL RULES:
 5. End with semicolon
 
 EXAMPLES:
-- "show all data" → SELECT * FROM {table_names[0]};
-- "count rows" → SELECT COUNT(*) FROM {table_names[0]};
-- "top 5 by revenue" → SELECT * FROM {table_names[0]} ORDER BY revenue DESC LIMIT 5;
+{self.examples_for(question)}
 
 SQL QUERY:"""
         
         try:
-            response = requests.post(f"{self.ollama_url}/api/generate", json={
-                "model": "llama3",
-                "prompt": prompt,
-                "stream": False,
-                "options": {
-                    "temperature": 0.1,
-                    "top_p": 0.9,
-                    "max_tokens": 150
-                }
-            })
-            
-            if response.status_code == 200:
-                result = response.json()
-                if result and "response" in result and result["response"]:
-                    sql = self.clean_sql(result["response"])
-                    return sql
+            result = self.router.generate('sql', prompt, {"temperature": 0.1, "top_p": 0.9, "num_predict": 150})
+            if result:
+                return self.clean_sql(result["response"])
         except Exception as e:
             print(f"LLM Error: {e}")
         
-        # Smart fallback based on question
+        return self.fallback_sql(question)
+    
+    def fallback_sql(self, question: str) -> str:
+        """Keyword-based guess used when the LLM gives no answer"""
+        table_names = list(self.tables.keys())
         if any(word in question.lower() for word in ['count', 'how many', 'total']):
             return f"SELECT COUNT(*) FROM {table_names[0]};"
         elif any(word in question.lower() for word in ['top', 'highest', 'maximum', 'best']):
@@ -122,8 +154,10 @@ SQL QUERY:"""
             return f"SELECT * FROM {table_names[0]} LIMIT 5;"
     
     def execute_query(self, sql_query: str) -> pd.DataFrame:
+        parsed = self.sql_guard.parse(sql_query)
         try:
-            return pd.read_sql_query(sql_query, self.db_connection)
+            # Canonical text + params hits sqlite3's prepared statement cache
+            return pd.read_sql_query(parsed.canonical, self.db.reader(), params=parsed.params)
         except Exception as e:
             if "no such table" in str(e).lower():
                 available = list(self.tables.keys())
@@ -172,6 +206,17 @@ SQL QUERY:"""
                 'success': False
             }
 
+    def analyze_batch(self, questions: List[str], max_concurrency: int = 4) -> List[Dict[str, Any]]:
+        """Analyze many questions with shared schema, concurrent LLM calls and deduplicated SQL"""
+        schema = self.get_enhanced_schema()
+        return run_batch(
+            questions,
+            lambda question: self.nl_to_sql(question, schema),
+            self.execute_query,
+            lambda question, sql, results: self.generate_simple_insights(question, results),
+            max_concurrency
+        )
+
 # Test the optimized version
 if __name__ == "__main__":
     analyst = OptimizedDataAnalyst()
@@ -195,9 +240,10 @@ if __name__ == "__main__":
         "count total products"
     ]
     
-    for q in questions:
-        result = analyst.analyze(q)
-        print(f"Q: {q}")
+    for result in analyst.analyze_batch(questions):
+        print(f"Q: {result['question']}")
         print(f"SQL: {result.get('sql_query', 'N/A')}")
         print(f"Result: {result.get('insights', result.get('error', 'N/A'))}")
-        print("-" * 50)
\ No newline at end of file
+        print(f"Time: {result['timings']['total']:.3f}s")
+        print("-" * 50)
+        analyst.accept_result(result)
\ No newline at end of file
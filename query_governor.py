@@ -0,0 +1,248 @@
+import re
+import json
+import importlib
+import math
+import time
+import threading
+from collections import defaultdict
+from typing import Dict, Iterator
+
+import pandas as pd
+
+
+class QueryRejected(Exception):
+    """Raised when a query's estimated cost is over budget and it can't be rewritten"""
+
+
+class QueryCancelled(Exception):
+    """Raised when a running query hits the timeout or is cancelled by the user"""
+
+
+class QueryGovernor:
+    """Cost check, wall-clock timeout and cancellation for generated SQL.
+
+    Cost is estimated from the query plan (``EXPLAIN QUERY PLAN`` on SQLite,
+    ``EXPLAIN FORMAT=JSON`` on MySQL) as the number of rows the nested loops
+    will visit. Over-budget queries that only stream rows are rewritten with
+    a LIMIT; anything else over budget is refused before it runs.
+    """
+
+    def __init__(self, max_cost: float = 5e7, timeout_seconds: float = 30.0, row_limit: int = 10000):
+        self.max_cost = max_cost
+        self.timeout_seconds = timeout_seconds
+        self.row_limit = row_limit
+        self._cancel = threading.Event()
+        self._active = {}       # thread ident -> (sqlite3 connection or MySQL connection id, engine)
+        self._lock = threading.Lock()
+
+    def _aliases(self, sql: str) -> Dict[str, str]:
+        """alias -> table for every FROM/JOIN source in ``sql``"""
+        aliases = {}
+        pattern = r'(?:\bfrom|\bjoin|,)\s+[`"\[]?([\w ]+?)[`"\]]?(?:\s+(?:as\s+)?(\w+))?(?=\s*(?:,|\bjoin\b|\bwhere\b|\bon\b|\bgroup\b|\border\b|\blimit\b|\)|;|$))'
+        for table, alias in re.findall(pattern, sql, re.IGNORECASE):
+            table = table.strip()
+            aliases[table] = table
+            if alias and alias.lower() not in ('where', 'on', 'group', 'order', 'limit', 'join', 'inner', 'left', 'right', 'cross', 'natural'):
+                aliases[alias] = table
+        return aliases
+
+    def estimate_sqlite_cost(self, connection, sql: str, row_counts: Dict[str, int]) -> float:
+        """Rows visited according to EXPLAIN QUERY PLAN; joins multiply, subqueries add"""
+        plan = connection.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+        children = defaultdict(list)
+        for node_id, parent, _, detail in plan:
+            children[parent].append((node_id, detail))
+        aliases = self._aliases(sql)
+        derived = {}
+
+        def rows_of(name: str) -> float:
+            name = name.strip('`"[] ')
+            if name in derived:
+                return derived[name]
+            table = aliases.get(name, name)
+            return float(row_counts.get(table, row_counts.get(table.lower(), 1)))
+
+        def cost(parent: int) -> float:
+            loop, extra = 1.0, 0.0
+            for node_id, detail in children[parent]:
+                upper = detail.upper()
+                if upper.startswith('SCAN CONSTANT ROW'):
+                    continue
+                if upper.startswith(('SCAN ', 'SEARCH ')):
+                    name = re.split(r'\s+USING\s+', detail[detail.index(' ') + 1:], flags=re.IGNORECASE)[0]
+                    n = rows_of(name)
+                    loop *= n if upper.startswith('SCAN ') else max(math.log2(n + 1), 1.0)
+                elif upper.startswith('CORRELATED'):
+                    loop *= max(cost(node_id), 1.0)
+                elif upper.startswith(('MATERIALIZE', 'CO-ROUTINE')):
+                    inner = cost(node_id)
+                    derived[detail.split(None, 1)[1].strip()] = inner
+                    extra += inner
+                elif not upper.startswith('USE TEMP B-TREE'):
+                    extra += cost(node_id)
+            return (loop if children[parent] else 0.0) + extra
+
+        return cost(0)
+
+    def estimate_mysql_cost(self, connection, sql: str) -> float:
+        """Optimizer cost (or product of examined rows) from EXPLAIN FORMAT=JSON"""
+        raw = connection.exec_driver_sql(f"EXPLAIN FORMAT=JSON {sql}").scalar()
+        plan = json.loads(raw)
+        query_cost = plan.get('query_block', {}).get('cost_info', {}).get('query_cost')
+        if query_cost is not None:
+            return float(query_cost)
+
+        rows = []
+
+        def walk(node):
+            if isinstance(node, dict):
+                if 'rows_examined_per_scan' in node:
+                    rows.append(float(node['rows_examined_per_scan']))
+                for value in node.values():
+                    walk(value)
+            elif isinstance(node, list):
+                for value in node:
+                    walk(value)
+
+        walk(plan)
+        return float(math.prod(rows)) if rows else 0.0
+
+    def govern(self, sql: str, cost: float) -> str:
+        """Return ``sql`` (possibly rewritten) if it may run, else raise QueryRejected"""
+        if cost <= self.max_cost:
+            return sql
+        streaming = not re.search(r'\b(GROUP\s+BY|ORDER\s+BY|DISTINCT|UNION|COUNT|SUM|AVG|MIN|MAX)\b', sql, re.IGNORECASE)
+        if streaming and not re.search(r'\bLIMIT\s+\d+', sql, re.IGNORECASE):
+            # Without sorting or aggregation the engine stops after LIMIT rows
+            return f"{sql.rstrip().rstrip(';')} LIMIT {self.row_limit}"
+        raise QueryRejected(
+            f"Query is too expensive to run (estimated {cost:,.0f} row visits, budget {self.max_cost:,.0f}). "
+            "Try adding filters or a join condition."
+        )
+
+    def _check_cancelled_before_start(self):
+        # A cancel that arrived while the LLM was still working stops the query before it starts
+        if self._cancel.is_set():
+            self._cancel.clear()
+            raise QueryCancelled("Query cancelled.")
+
+    def run_sqlite(self, connection, sql: str, params: list = None) -> pd.DataFrame:
+        """Execute on SQLite with a progress-handler deadline; interrupted by ``cancel``"""
+        self._check_cancelled_before_start()
+        deadline = time.monotonic() + self.timeout_seconds
+
+        def check():
+            return 1 if self._cancel.is_set() or time.monotonic() > deadline else 0
+
+        with self._lock:
+            self._active[threading.get_ident()] = (connection, None)
+        connection.set_progress_handler(check, 10000)
+        try:
+            return pd.read_sql_query(sql, connection, params=params)
+        except Exception as e:
+            if 'interrupted' in str(e).lower():
+                raise QueryCancelled(self._stop_reason())
+            raise
+        finally:
+            connection.set_progress_handler(None, 0)
+            self._finish()
+
+    def run_mysql(self, engine, sql: str) -> pd.DataFrame:
+        """Execute on MySQL with a MAX_EXECUTION_TIME hint; killable by ``cancel``"""
+        self._check_cancelled_before_start()
+        timeout_ms = int(self.timeout_seconds * 1000)
+        sql = re.sub(r'^\s*SELECT\b', f'SELECT /*+ MAX_EXECUTION_TIME({timeout_ms}) */', sql, count=1, flags=re.IGNORECASE)
+        with engine.connect() as connection:
+            connection_id = connection.exec_driver_sql("SELECT CONNECTION_ID()").scalar()
+            with self._lock:
+                self._active[threading.get_ident()] = (connection_id, engine)
+            try:
+                return pd.read_sql_query(sql, connection)
+            except Exception as e:
+                message = str(e).lower()
+                if 'max_execution_time' in message or 'interrupted' in message or 'query execution was' in message:
+                    raise QueryCancelled(self._stop_reason())
+                raise
+            finally:
+                self._finish()
+
+    def _unbuffered_cursor(self, connection, driver: str):
+        """DBAPI cursor that fetches rows from the server as they are read instead of all at execute"""
+        if driver == 'mysqlconnector':
+            return connection.cursor(buffered=False)
+        # pymysql and mysqlclient buffer the whole result unless given their server-side cursor class
+        cursors = importlib.import_module('pymysql.cursors' if driver == 'pymysql' else 'MySQLdb.cursors')
+        return connection.cursor(cursors.SSCursor)
+
+    def stream_mysql(self, engine, sql: str, chunksize: int = 5000) -> Iterator[pd.DataFrame]:
+        """Like ``run_mysql`` but yields DataFrame chunks read through an unbuffered cursor.
+
+        SQLAlchemy's ``stream_results`` is a no-op on mysql-connector, whose
+        dialect buffers every row, so this drives the DBAPI cursor directly.
+        """
+        self._check_cancelled_before_start()
+        timeout_ms = int(self.timeout_seconds * 1000)
+        sql = re.sub(r'^\s*SELECT\b', f'SELECT /*+ MAX_EXECUTION_TIME({timeout_ms}) */', sql, count=1, flags=re.IGNORECASE)
+        connection = engine.raw_connection()
+        cursor, exhausted = None, False
+        try:
+            id_cursor = connection.cursor()
+            id_cursor.execute("SELECT CONNECTION_ID()")
+            connection_id = id_cursor.fetchone()[0]
+            id_cursor.close()
+            with self._lock:
+                self._active[threading.get_ident()] = (connection_id, engine)
+
+            cursor = self._unbuffered_cursor(connection, engine.dialect.driver)
+            cursor.execute(sql)
+            columns = [column[0] for column in cursor.description]
+            while True:
+                if self._cancel.is_set():
+                    raise QueryCancelled(self._stop_reason())
+                rows = cursor.fetchmany(chunksize)
+                if not rows:
+                    exhausted = True
+                    break
+                yield pd.DataFrame.from_records(rows, columns=columns)
+        except QueryCancelled:
+            raise
+        except Exception as e:
+            message = str(e).lower()
+            if 'max_execution_time' in message or 'interrupted' in message or 'query execution was' in message:
+                raise QueryCancelled(self._stop_reason())
+            raise
+        finally:
+            self._finish()
+            if exhausted:
+                cursor.close()
+                connection.close()
+            else:
+                # Unread rows are still on the wire; don't hand this connection back to the pool
+                connection.invalidate()
+
+    def _finish(self):
+        with self._lock:
+            self._active.pop(threading.get_ident(), None)
+            if not self._active:
+                self._cancel.clear()
+
+    def _stop_reason(self) -> str:
+        if self._cancel.is_set():
+            return "Query cancelled."
+        return f"Query timed out after {self.timeout_seconds:g}s."
+
+    def cancel(self):
+        """Stop every running query, if any. Safe to call from another thread."""
+        self._cancel.set()
+        with self._lock:
+            active = list(self._active.values())
+        for handle, engine in active:
+            if engine is None:
+                handle.interrupt()
+            else:
+                with engine.connect() as connection:
+                    connection.exec_driver_sql(f"KILL QUERY {int(handle)}")
+
+    def is_running(self) -> bool:
+        with self._lock:
+            return bool(self._active)
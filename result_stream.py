@@ -0,0 +1,66 @@
+import random
+from typing import Iterable, List, Optional
+
+import pandas as pd
+
+
+class StreamedResult:
+    """Bounded view of a query result consumed chunk by chunk.
+
+    Keeps the first ``max_rows`` rows for the results table, a uniform
+    reservoir sample of ``sample_size`` rows (in original order) for charts
+    and the total row count for insights, so memory stays flat no matter
+    how many rows the query returns.
+    """
+
+    def __init__(self, max_rows: int = 10000, sample_size: int = 2000, seed: int = 0):
+        self.max_rows = max_rows
+        self.sample_size = sample_size
+        self.row_count = 0
+        self.columns: Optional[List[str]] = None
+        self._head = []
+        self._head_rows = 0
+        self._reservoir = []     # (row position, record)
+        self._random = random.Random(seed)
+
+    def add(self, chunk: pd.DataFrame):
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+        room = self.max_rows - self._head_rows
+        if room > 0:
+            self._head.append(chunk.iloc[:room])
+            self._head_rows += min(room, len(chunk))
+
+        start = self.row_count
+        fill = max(0, min(self.sample_size - start, len(chunk)))
+        if fill:
+            records = chunk.iloc[:fill].to_dict('records')
+            self._reservoir.extend(zip(range(start, start + fill), records))
+        # Algorithm R: row i replaces a random slot with probability sample_size / (i + 1)
+        for offset in range(fill, len(chunk)):
+            slot = self._random.randrange(start + offset + 1)
+            if slot < self.sample_size:
+                self._reservoir[slot] = (start + offset, chunk.iloc[offset].to_dict())
+        self.row_count += len(chunk)
+
+    def consume(self, chunks: Iterable[pd.DataFrame]) -> 'StreamedResult':
+        for chunk in chunks:
+            self.add(chunk)
+        return self
+
+    @property
+    def truncated(self) -> bool:
+        return self.row_count > self._head_rows
+
+    def frame(self) -> pd.DataFrame:
+        """The first ``max_rows`` rows"""
+        if not self._head:
+            return pd.DataFrame(columns=self.columns or [])
+        return pd.concat(self._head, ignore_index=True)
+
+    def sample(self) -> pd.DataFrame:
+        """Uniform sample across the whole result, in result order"""
+        if not self.truncated:
+            return self.frame()
+        rows = [record for _, record in sorted(self._reservoir, key=lambda item: item[0])]
+        return pd.DataFrame(rows, columns=self.columns)
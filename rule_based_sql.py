@@ -0,0 +1,241 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+from value_index import ValueIndex, normalize
+
+
+# Questions containing any of these need reasoning the templates can't express
+COMPLEX_MARKERS = [
+    'compare', 'versus', 'vs', 'trend', 'over time', 'growth', 'correlation', 'relationship',
+    'between', 'percentage', 'percent', 'ratio', 'share', 'distinct', 'unique', 'why',
+    'not', 'except', 'without', 'excluding', 'over', 'above', 'below', 'under', 'more than',
+    'less than', 'greater', 'fewer', 'after', 'before', 'since', 'until', 'join', 'median',
+]
+
+COUNT_WORDS = ['how many', 'count', 'number of']
+AGGREGATE_WORDS = {
+    'SUM': ['total', 'sum'],
+    'AVG': ['average', 'avg', 'mean'],
+    'MIN': ['minimum', 'min'],
+    'MAX': ['maximum', 'max'],
+}
+TOP_WORDS = ['top', 'highest', 'most', 'best', 'largest', 'biggest']
+BOTTOM_WORDS = ['bottom', 'lowest', 'least', 'worst', 'smallest']
+LIST_WORDS = ['show', 'list', 'display', 'give me', 'find', 'get']
+GROUP_WORDS = r'(?:by|per|for each|each|across)'
+# Function words a templated question may contain besides the words above, values, columns and numbers
+FILLER_WORDS = {
+    'what', 'which', 'is', 'are', 'was', 'were', 'the', 'a', 'an', 'of', 'in', 'for', 'with', 'me', 'all',
+    'and', 'to', 'on', 'at', 'from', 'there', 'do', 'does', 'we', 'have', 'has', 'it', 'its', 'their',
+    'please', 'rows', 'records', 'entries', 'value', 'values', 'that', 'those', 'these', 'whose',
+}
+TEMPLATE_WORDS = FILLER_WORDS | {
+    word for phrases in [COUNT_WORDS, TOP_WORDS, BOTTOM_WORDS, LIST_WORDS, *AGGREGATE_WORDS.values(),
+                         ['by', 'per', 'each', 'across', 'first', 'last']]
+    for phrase in phrases for word in phrase.split()
+}
+
+# Column-name tokens too generic to identify a column on their own
+GENERIC_TOKENS = {'name', 'type', 'date', 'number', 'code', 'value', 'amount', 'data'}
+
+
+class RuleBasedSQL:
+    """Template NL->SQL for simple questions, tried before any LLM call.
+
+    Covers counts, top-N by a column, sums/averages grouped by a column and
+    equality filters on known categorical values. ``translate`` returns None
+    whenever the question is not matched unambiguously, including any word
+    it can't explain as a value, column or template keyword, so the caller
+    can hand it to the LLM instead.
+    """
+
+    def __init__(self, tables: Dict[str, Dict], value_index: ValueIndex,
+                 quote_char: str = '"', list_limit: int = 100):
+        self.tables = tables
+        self.value_index = value_index
+        self.quote_char = quote_char
+        self.list_limit = list_limit
+
+    def quote(self, identifier: str) -> str:
+        q = self.quote_char
+        return f"{q}{identifier.replace(q, q + q)}{q}"
+
+    def literal(self, value: str) -> str:
+        return "'" + str(value).replace("'", "''") + "'"
+
+    def _find(self, text: str, phrase: str) -> int:
+        """Position of ``phrase`` in ``text`` on word boundaries (plural-tolerant), or -1"""
+        for variant in (phrase, phrase + 's', phrase + 'es', phrase[:-1] if phrase.endswith('s') else None):
+            if not variant:
+                continue
+            match = re.search(rf'(?<![0-9a-z]){re.escape(variant)}(?![0-9a-z])', text)
+            if match:
+                return match.start()
+        return -1
+
+    def _has_any(self, text: str, words: List[str]) -> bool:
+        return any(re.search(rf'(?<![0-9a-z]){re.escape(w)}(?![0-9a-z])', text) for w in words)
+
+    def _column_aliases(self, columns: List[str]) -> List[Tuple[str, str]]:
+        """(alias, column) pairs: full normalized names plus tokens unique to one column"""
+        aliases = [(normalize(col), col) for col in columns if normalize(col)]
+        token_owner = {}
+        for col in columns:
+            for token in set(normalize(col).split()):
+                if len(token) < 4 or token in GENERIC_TOKENS:
+                    continue
+                token_owner.setdefault(token, set()).add(col)
+        full_names = {alias for alias, _ in aliases}
+        for token, owners in token_owner.items():
+            if len(owners) == 1 and token not in full_names:
+                aliases.append((token, next(iter(owners))))
+        return sorted(aliases, key=lambda pair: len(pair[0]), reverse=True)
+
+    def _mentions(self, text: str, table: str) -> Tuple[List[Tuple[str, str]], List[Tuple[int, str]], bool, str]:
+        """Resolve value filters and column mentions in ``text``.
+
+        Returns (filters, columns, ambiguous, rest) where filters are
+        (column, value) pairs, columns are (position, column) pairs and rest is
+        ``text`` with every resolved span masked out.
+        """
+        info = self.tables[table]
+        consumed = text
+        filters = []
+        ambiguous = False
+
+        spans = {}
+        for start, end, _, col, value in self.value_index.lookup(text, table):
+            spans.setdefault((start, end), []).append((col, value))
+        for (start, end), hits in spans.items():
+            if len(hits) > 1:
+                ambiguous = True  # same phrase is a value of several columns
+                continue
+            consumed = consumed[:start] + '#' * (end - start) + consumed[end:]
+            filters.append(hits[0])
+
+        columns = []
+        for alias, col in self._column_aliases(info['columns']):
+            pos = self._find(consumed, alias)
+            if pos < 0:
+                continue
+            consumed = consumed[:pos] + '#' * len(alias) + consumed[pos + len(alias):]
+            if col not in [c for _, c in columns]:
+                columns.append((pos, col))
+        columns.sort()
+
+        filtered_cols = [col for col, _ in filters]
+        if len(filtered_cols) != len(set(filtered_cols)):
+            ambiguous = True  # "Asia or Europe" needs OR/IN, leave it to the LLM
+        return filters, columns, ambiguous, consumed
+
+    def _pick_table(self, text: str) -> Optional[str]:
+        names = list(self.tables.keys())
+        if len(names) == 1:
+            return names[0]
+        named = [name for name in names if self._find(text, normalize(name)) >= 0]
+        if len(named) == 1:
+            return named[0]
+        scores = {}
+        for name in names:
+            filters, columns, _, _ = self._mentions(text, name)
+            scores[name] = len(filters) + len(columns)
+        best = max(scores.values()) if scores else 0
+        winners = [name for name, score in scores.items() if score == best]
+        return winners[0] if best > 0 and len(winners) == 1 else None
+
+    def translate(self, question: str) -> Optional[str]:
+        """Return SQL for ``question`` if a template matches confidently, else None"""
+        if not self.tables:
+            return None
+        text = normalize(question)
+        if not text or self._has_any(text, COMPLEX_MARKERS):
+            return None
+
+        table = self._pick_table(text)
+        if not table:
+            return None
+        info = self.tables[table]
+        filters, columns, ambiguous, rest = self._mentions(text, table)
+        if ambiguous:
+            return None
+
+        numeric = set(info.get('numeric_columns', []))
+        limit_match = re.search(r'\b(?:top|bottom|first|last)\s+(\d+)\b', text) or \
+            re.search(r'\b(\d+)\s+(?:highest|lowest|most|least|best|worst|largest|smallest)\b', text)
+        numbers = re.findall(r'\b\d+\b', rest)
+        if len(numbers) > (1 if limit_match else 0):
+            return None  # numeric filters (years, thresholds) are not templated
+        table_words = set(normalize(table).split())
+        for word in rest.split():
+            # Masked words ("#####s" for "models") were resolved to a value or column
+            if not ('#' in word or word.isdigit() or word in TEMPLATE_WORDS or word in table_words or word.rstrip('s') in table_words):
+                return None  # "average salary of managers": a condition the templates would drop
+
+        group_col = None
+        group_match = re.search(rf'\b{GROUP_WORDS}\s+(?:(?:the|each|total|sum|average|avg|mean|maximum|max|minimum|min)\s+)*', text)
+        if group_match:
+            for pos, col in columns:
+                if pos == group_match.end():
+                    group_col = col
+            if group_col is None:
+                return None
+        others = [col for _, col in columns if col != group_col]
+
+        where = ''
+        if filters:
+            where = ' WHERE ' + ' AND '.join(f"{self.quote(c)} = {self.literal(v)}" for c, v in filters)
+        source = f"FROM {self.quote(table)}{where}"
+
+        aggregate = None
+        for func, words in AGGREGATE_WORDS.items():
+            if self._has_any(text, words):
+                if aggregate:
+                    return None
+                aggregate = func
+        is_count = self._has_any(text, COUNT_WORDS)
+        is_top = self._has_any(text, TOP_WORDS)
+        is_bottom = self._has_any(text, BOTTOM_WORDS)
+        if is_top and is_bottom:
+            return None
+
+        measures = [col for col in others if col in numeric]
+        entities = [col for col in others if col not in numeric]
+
+        if aggregate and len(measures) == 1 and not entities and not (is_top or is_bottom):
+            measure = self.quote(measures[0])
+            alias = self.quote(f"{aggregate.lower()}_{measures[0].strip()}")
+            if group_col:
+                group = self.quote(group_col)
+                return (f"SELECT {group}, {aggregate}({measure}) AS {alias} {source} "
+                        f"GROUP BY {group} ORDER BY {alias} DESC")
+            return f"SELECT {aggregate}({measure}) AS {alias} {source}"
+
+        if is_count and not others and not (is_top or is_bottom) and aggregate in (None, 'SUM'):
+            if group_col:
+                group = self.quote(group_col)
+                return f"SELECT {group}, COUNT(*) AS count {source} GROUP BY {group} ORDER BY count DESC"
+            return f"SELECT COUNT(*) AS count {source}"
+
+        if (is_top or is_bottom) and not is_count:
+            direction = 'DESC' if is_top else 'ASC'
+            limit = int(limit_match.group(1)) if limit_match else (10 if 'top' in text.split() or 'bottom' in text.split() else 1)
+            if group_col in numeric and len(entities) == 1 and not measures:
+                # "top 5 models by total sales volume": rank groups by the aggregate the question names;
+                # without one ("by price") a total may be meaningless, so the LLM decides
+                if aggregate is None:
+                    return None
+                entity, measure = self.quote(entities[0]), self.quote(group_col)
+                alias = self.quote(f"{aggregate.lower()}_{group_col.strip()}")
+                return (f"SELECT {entity}, {aggregate}({measure}) AS {alias} {source} "
+                        f"GROUP BY {entity} ORDER BY {alias} {direction} LIMIT {limit}")
+            if aggregate:
+                return None
+            order_cols = measures if group_col is None else [group_col] if group_col in numeric else []
+            if len(order_cols) == 1 and len(entities) <= 1:
+                return f"SELECT * {source} ORDER BY {self.quote(order_cols[0])} {direction} LIMIT {limit}"
+            return None
+
+        if self._has_any(text, LIST_WORDS) and not (aggregate or is_count) and group_col is None and not measures:
+            if filters or re.search(r'\ball\b', text):
+                return f"SELECT * {source} LIMIT {self.list_limit}"
+        return None
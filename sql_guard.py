@@ -0,0 +1,169 @@
+import re
+from collections import OrderedDict
+from typing import Any, Iterable, List, NamedTuple, Optional
+
+
+class UnsafeQuery(Exception):
+    """Raised for SQL that is not a single read-only statement"""
+
+
+class ParsedSQL(NamedTuple):
+    statement_type: str   # SELECT / WITH / VALUES
+    canonical: str        # normalized text with literals replaced by ? placeholders
+    params: List[Any]     # literal values, in placeholder order
+    text: str             # normalized text with literals inlined
+
+
+TOKEN_PATTERN = re.compile(r"""
+    (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<ident>`(?:[^`]|``)*`|"(?:[^"]|"")*"|\[[^\]]*\])
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<word>[A-Za-z_][\w$]*)
+  | (?P<space>\s+)
+  | (?P<op><=|>=|<>|!=|\|\||[^\s])
+""", re.VERBOSE | re.DOTALL)
+
+READ_ONLY_STARTS = {'SELECT', 'WITH', 'VALUES'}
+
+# Never valid in a read-only query, wherever they appear
+FORBIDDEN_WORDS = {
+    'INSERT', 'UPDATE', 'DELETE', 'DROP', 'CREATE', 'ALTER', 'TRUNCATE', 'ATTACH', 'DETACH',
+    'PRAGMA', 'INTO', 'GRANT', 'REVOKE', 'LOAD_EXTENSION', 'OUTFILE', 'DUMPFILE',
+}
+
+FUNCTION_KEYWORDS = {'COUNT', 'SUM', 'AVG', 'MIN', 'MAX', 'ROUND', 'UPPER', 'LOWER', 'LENGTH', 'COALESCE', 'CAST'}
+KEYWORDS = FUNCTION_KEYWORDS | {
+    'SELECT', 'FROM', 'WHERE', 'GROUP', 'BY', 'ORDER', 'HAVING', 'LIMIT', 'OFFSET', 'AS', 'AND',
+    'OR', 'NOT', 'IN', 'IS', 'NULL', 'LIKE', 'BETWEEN', 'JOIN', 'INNER', 'LEFT', 'RIGHT', 'OUTER',
+    'CROSS', 'NATURAL', 'ON', 'USING', 'UNION', 'ALL', 'DISTINCT', 'CASE', 'WHEN', 'THEN', 'ELSE',
+    'END', 'ASC', 'DESC', 'WITH', 'RECURSIVE', 'EXISTS', 'INTERSECT', 'EXCEPT', 'VALUES', 'OVER',
+    'PARTITION', 'WINDOW', 'ROWS', 'RANGE', 'COLLATE', 'ESCAPE', 'TRUE', 'FALSE',
+}
+
+CLAUSE_KEYWORDS = {'SELECT', 'FROM', 'JOIN', 'ON', 'WHERE', 'GROUP', 'HAVING', 'ORDER', 'LIMIT', 'OFFSET'}
+# Literals are lifted into parameters only inside these clauses: the SELECT list
+# would get "?" column names and positional GROUP BY 1 / ORDER BY 2 must stay literal
+PARAMETER_CLAUSES = {'ON', 'WHERE', 'HAVING', 'LIMIT', 'OFFSET'}
+
+
+def tokenize(sql: str) -> List[tuple]:
+    """(kind, text) tokens with whitespace and comments dropped"""
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(sql):
+        kind = match.lastgroup
+        if kind not in ('space', 'comment'):
+            tokens.append((kind, match.group()))
+    return tokens
+
+
+def tables_in_sql(sql: str, table_names: Iterable[str]) -> List[str]:
+    """Loaded tables referenced by ``sql`` (quoted or bare identifiers)"""
+    lookup = {name.lower(): name for name in table_names}
+    found = []
+    for kind, text in tokenize(sql):
+        if kind == 'ident':
+            text = text[1:-1]
+        elif kind != 'word':
+            continue
+        name = lookup.get(text.lower())
+        if name and name not in found:
+            found.append(name)
+    return found
+
+
+def _join(parts: List[str]) -> str:
+    text, previous = '', ''
+    for part in parts:
+        function_call = part == '(' and re.match(r'\w', previous) and (
+            previous not in KEYWORDS or previous in FUNCTION_KEYWORDS)
+        if not text or part in (',', ')', '.') or previous in ('(', '.') or function_call:
+            text += part  # no space before a call's "(": MySQL rejects "COUNT (*)"
+        else:
+            text += ' ' + part
+        previous = part
+    return text
+
+
+class SQLGuard:
+    """Read-only statement allowlist and canonical form for generated SQL.
+
+    ``parse`` rejects anything other than a single SELECT/WITH/VALUES
+    statement and returns a canonical form: comments and extra whitespace
+    removed, keywords uppercased and literals lifted out as parameters.
+    Structurally identical queries share the same canonical text, which
+    keys the plan cache here and the driver's prepared-statement cache.
+    """
+
+    def __init__(self, plan_cache_size: int = 256):
+        self.plan_cache_size = plan_cache_size
+        self.plans = OrderedDict()
+
+    def parse(self, sql: str) -> ParsedSQL:
+        tokens = tokenize(sql)
+        while tokens and tokens[-1] == ('op', ';'):
+            tokens.pop()
+        if not tokens:
+            raise UnsafeQuery("Empty SQL query.")
+        if ('op', ';') in tokens:
+            raise UnsafeQuery("Only a single SQL statement is allowed.")
+
+        first = next((text.upper() for kind, text in tokens if kind == 'word'), '')
+        if first not in READ_ONLY_STARTS or tokens[0][0] not in ('word', 'op'):
+            raise UnsafeQuery(f"Only read-only SELECT queries are allowed (got {first or tokens[0][1]}).")
+        for kind, text in tokens:
+            if kind == 'word' and text.upper() in FORBIDDEN_WORDS:
+                raise UnsafeQuery(f"Only read-only SELECT queries are allowed ({text.upper()} is not permitted).")
+
+        canonical, inline, params = [], [], []
+        clause, outer = first, []
+        for i, (kind, text) in enumerate(tokens):
+            upper = text.upper()
+            if kind == 'word':
+                if upper in CLAUSE_KEYWORDS:
+                    clause = upper
+                # Function names double as column aliases ("AS count"); only uppercase calls
+                is_call = i + 1 < len(tokens) and tokens[i + 1][1] == '('
+                is_keyword = upper in KEYWORDS and (upper not in FUNCTION_KEYWORDS or is_call)
+                word = upper if is_keyword else text
+                canonical.append(word)
+                inline.append(word)
+            elif kind in ('string', 'number') and clause in PARAMETER_CLAUSES:
+                canonical.append('?')
+                inline.append(text)
+                if kind == 'string':
+                    params.append(text[1:-1].replace("''", "'"))
+                else:
+                    params.append(float(text) if re.search(r'[.eE]', text) else int(text))
+            else:
+                if text == '(':
+                    outer.append(clause)
+                elif text == ')' and outer:
+                    clause = outer.pop()
+                canonical.append(text)
+                inline.append(text)
+        return ParsedSQL(first, _join(canonical), params, _join(inline))
+
+    def is_read_only(self, sql: str) -> bool:
+        try:
+            self.parse(sql)
+            return True
+        except UnsafeQuery:
+            return False
+
+    def cached_plan(self, canonical: str) -> Optional[Any]:
+        """Plan information stored for this query shape, if any"""
+        if canonical in self.plans:
+            self.plans.move_to_end(canonical)
+            return self.plans[canonical]
+        return None
+
+    def store_plan(self, canonical: str, plan: Any):
+        self.plans[canonical] = plan
+        self.plans.move_to_end(canonical)
+        while len(self.plans) > self.plan_cache_size:
+            self.plans.popitem(last=False)
+
+    def clear_plans(self):
+        """Drop cached plans, e.g. after table data or schema changed"""
+        self.plans.clear()
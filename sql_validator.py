@@ -0,0 +1,124 @@
+import re
+import difflib
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+# Error messages that name a single unknown identifier (SQLite and MySQL wording)
+UNKNOWN_COLUMN_PATTERNS = [
+    r"no such column:\s*\"?(.+?)\"?(?:\s+-\s+should this.*)?\s*$",
+    r"Unknown column '([^']+)'",
+]
+SYNTAX_ERROR_PATTERNS = [
+    r'near "([^"]+)": syntax error',
+    r"near '([^'\s]+)",
+]
+UNKNOWN_TABLE_PATTERNS = [
+    r"no such table:\s*([^\s]+)",
+    r"Table '(?:[^'.]+\.)?([^']+)' doesn't exist",
+]
+
+
+def _key(name: str) -> str:
+    return re.sub(r'[^0-9a-z]', '', name.lower())
+
+
+class SQLValidator:
+    """Check generated SQL against the schema before running it.
+
+    Statements are prepared with ``EXPLAIN`` through the ``explain`` callable,
+    which compiles the query without reading table data. Unknown tables and
+    columns reported by the database are replaced with the nearest known
+    name and the statement is prepared again.
+    """
+
+    def __init__(self, tables: Dict[str, Dict], explain: Callable[[str], None], max_fixes: int = 5):
+        self.tables = tables
+        self.explain = explain
+        self.max_fixes = max_fixes
+
+    def nearest(self, name: str, candidates: List[str]) -> Optional[str]:
+        """Closest candidate to ``name`` ignoring case, spaces and punctuation"""
+        keyed = {_key(c): c for c in candidates}
+        if _key(name) in keyed:
+            return keyed[_key(name)]
+        match = difflib.get_close_matches(_key(name), list(keyed.keys()), n=1, cutoff=0.6)
+        return keyed[match[0]] if match else None
+
+    def replace_identifier(self, sql: str, old: str, new: str) -> str:
+        """Swap identifier ``old`` for backtick-quoted ``new`` outside string literals"""
+        parts = re.split(r"('(?:[^']|'')*')", sql)
+        pattern = rf"`{re.escape(old)}`|\"{re.escape(old)}\"|\[{re.escape(old)}\]|(?<![\w`\"]){re.escape(old)}(?![\w`\"])"
+        for i in range(0, len(parts), 2):
+            parts[i] = re.sub(pattern, f"`{new}`", parts[i])
+        return ''.join(parts)
+
+    def _all_columns(self) -> List[str]:
+        columns = []
+        for info in self.tables.values():
+            columns.extend(c for c in info['columns'] if c not in columns)
+        return columns
+
+    def _fix(self, sql: str, error: str) -> Optional[str]:
+        for pattern in SYNTAX_ERROR_PATTERNS:
+            match = re.search(pattern, error, re.IGNORECASE)
+            if match:
+                # "SUM(Sales Volume)" fails near "Volume": rejoin the words into the column
+                keyed = {_key(c): c for c in self._all_columns()}
+                near = match.group(1)
+                for found in re.finditer(rf"((?:\w+\s+){{1,3}}){re.escape(near)}(?![\w`\"])", sql):
+                    words = found.group(1).split()
+                    for n in range(len(words), 0, -1):
+                        phrase = ' '.join(words[-n:] + [near])
+                        if _key(phrase) in keyed:
+                            return self.replace_identifier(sql, phrase, keyed[_key(phrase)])
+                return None
+
+        for pattern in UNKNOWN_TABLE_PATTERNS:
+            match = re.search(pattern, error, re.IGNORECASE)
+            if match:
+                bad = match.group(1).strip('`"')
+                table = self.nearest(bad, list(self.tables.keys()))
+                return self.replace_identifier(sql, bad, table) if table else None
+
+        for pattern in UNKNOWN_COLUMN_PATTERNS:
+            match = re.search(pattern, error, re.IGNORECASE)
+            if match:
+                bad = match.group(1).strip('`"')
+                qualifier, _, bad_col = bad.rpartition('.')
+                columns = self._all_columns()
+                # An unquoted "Sales Volume" is reported as "Sales"; take the
+                # following words too when together they name a known column
+                keyed = {_key(c): c for c in columns}
+                following = re.search(rf"(?<![\w`\"]){re.escape(bad)}((?:\s+\w+){{1,3}})", sql)
+                if following and not qualifier:
+                    words = following.group(1).split()
+                    for n in range(len(words), 0, -1):
+                        phrase = ' '.join([bad_col] + words[:n])
+                        if _key(phrase) in keyed:
+                            return self.replace_identifier(sql, phrase, keyed[_key(phrase)])
+                column = self.nearest(bad_col, columns)
+                if not column:
+                    return None
+                old = f"{qualifier}.{bad_col}" if qualifier else bad_col
+                new = f"{qualifier}.{column}" if qualifier else column
+                fixed = self.replace_identifier(sql, old, new)
+                return fixed.replace(f"`{qualifier}.{column}`", f"{qualifier}.`{column}`") if qualifier else fixed
+        return None
+
+    def validate(self, sql: str) -> Tuple[str, Optional[str]]:
+        """Prepare ``sql``, repairing unknown identifiers.
+
+        Returns (sql, error); error is None when the (possibly repaired)
+        statement compiles, otherwise the database's exact message.
+        """
+        for _ in range(self.max_fixes + 1):
+            try:
+                self.explain(sql)
+                return sql, None
+            except Exception as e:
+                error = str(e)
+            fixed = self._fix(sql, error)
+            if not fixed or fixed == sql:
+                return sql, error
+            sql = fixed
+        return sql, error
@@ -0,0 +1,88 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import Callable
+from urllib.parse import quote
+
+
+class SQLiteConnectionManager:
+    """File-backed SQLite database in WAL mode, safe to use from many threads.
+
+    ``load_file`` and other writers go through the single ``writer`` connection
+    under a lock; queries use ``reader``, which hands each thread its own
+    read-only connection so concurrent questions run in parallel instead of
+    sharing one cursor. Per-connection state (ATTACH, temp views) is registered
+    with ``add_setup`` and replayed on every reader before it is used.
+    """
+
+    def __init__(self, path: str = None):
+        if path is None:
+            temp_dir = tempfile.mkdtemp(prefix='analyst_db_')
+            path = os.path.join(temp_dir, 'tables.db')
+            weakref.finalize(self, shutil.rmtree, temp_dir, True)
+        self.path = path
+        self.uri = f"file:{quote(os.path.abspath(path))}?mode=ro"
+
+        self._writer = sqlite3.connect(path, check_same_thread=False)
+        self._writer.execute("PRAGMA journal_mode = WAL")
+        self._writer.execute("PRAGMA synchronous = NORMAL")
+        self._write_lock = threading.Lock()
+
+        self._readers = {}   # thread ident -> [thread, connection, setup steps applied]
+        self._setup = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def writer(self):
+        """The single writer connection; commits on success, rolls back on error"""
+        with self._write_lock:
+            try:
+                yield self._writer
+                self._writer.commit()
+            except Exception:
+                self._writer.rollback()
+                raise
+
+    def add_setup(self, step: Callable[[sqlite3.Connection], None]):
+        """Run ``step(connection)`` on every reader, current and future"""
+        with self._lock:
+            self._setup.append(step)
+
+    def reader(self) -> sqlite3.Connection:
+        """Read-only connection owned by the calling thread"""
+        ident = threading.get_ident()
+        with self._lock:
+            self._prune()
+            entry = self._readers.get(ident)
+            if entry is None:
+                connection = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+                entry = [threading.current_thread(), connection, 0]
+                self._readers[ident] = entry
+            pending = self._setup[entry[2]:]
+            entry[2] = len(self._setup)
+        for step in pending:
+            step(entry[1])
+        return entry[1]
+
+    def _prune(self):
+        # Streamlit runs every script rerun on a fresh thread; drop connections of finished ones
+        for ident, (thread, connection, _) in list(self._readers.items()):
+            if not thread.is_alive():
+                connection.close()
+                del self._readers[ident]
+
+    def reader_count(self) -> int:
+        with self._lock:
+            return len(self._readers)
+
+    def close(self):
+        with self._lock:
+            for _, connection, _ in self._readers.values():
+                connection.close()
+            self._readers.clear()
+        with self._write_lock:
+            self._writer.close()
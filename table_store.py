@@ -0,0 +1,133 @@
+import hashlib
+import threading
+from typing import Dict, List, NamedTuple, Tuple
+
+import pandas as pd
+
+from sqlite_pool import SQLiteConnectionManager
+from file_reader import read_source
+from metrics import CACHE_REQUESTS
+
+
+class SharedDataset(NamedTuple):
+    key: str                         # sha256 of the file content, with the variant folded in
+    uri: str                         # read-only SQLite URI of the database holding the data
+    info: Dict                       # columns / sample_data / row_count / memory_bytes, as in assistant.tables
+    values: Dict[str, List[str]]     # categorical values for the value index
+
+
+def read_table(data, file_name: str, sheet=0, columns: List[str] = None) -> pd.DataFrame:
+    """Parse CSV/Excel content held in memory (bytes or a buffer such as ``file.getbuffer()``)"""
+    return read_source(data, file_name, sheet, columns)
+
+
+def content_digest(data) -> str:
+    """sha256 of file content; compute it once and pass it as ``digest`` to skip rehashing"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def dataset_key(digest: str, variant: str = None) -> str:
+    if variant is None:
+        return digest
+    return hashlib.sha256(f"{digest}\0{variant}".encode()).hexdigest()
+
+
+class SharedTableStore:
+    """Process-wide registry of uploaded datasets, keyed by file content hash.
+
+    Each distinct file is parsed once into its own WAL-mode SQLite database.
+    Sessions attach that database read-only to their own connections and see
+    it through a temp view, so memory grows with the number of distinct
+    datasets rather than the number of users.
+    """
+
+    def __init__(self, max_distinct: int = 50):
+        self.max_distinct = max_distinct
+        self._datasets = {}
+        self._databases = {}    # key -> SQLiteConnectionManager owning the file
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def contains(self, data, variant: str = None, digest: str = None) -> bool:
+        """Whether ``data`` was already loaded (so ``get_or_load`` won't parse it)"""
+        key = dataset_key(digest or content_digest(data), variant)
+        with self._lock:
+            return key in self._datasets
+
+    def get_or_load(self, data, file_name: str, df: pd.DataFrame = None, variant: str = None,
+                    digest: str = None) -> SharedDataset:
+        """Return the dataset for ``data``, parsing it only the first time it is seen.
+
+        ``df`` is ``data`` already parsed elsewhere (e.g. in a worker process).
+        ``variant`` tells apart several datasets from one file, such as the
+        sheets of a workbook; ``df`` must be given with it. ``digest`` is
+        ``content_digest(data)`` when the caller already has it.
+        """
+        key = dataset_key(digest or content_digest(data), variant)
+        with self._key_lock(key):
+            if key in self._datasets:
+                CACHE_REQUESTS.inc(cache='dataset', result='hit')
+                return self._datasets[key]
+            CACHE_REQUESTS.inc(cache='dataset', result='miss')
+
+            if df is None:
+                df = read_table(data, file_name)
+            database = SQLiteConnectionManager()
+            with database.writer() as connection:
+                df.to_sql('data', connection, if_exists='replace', index=False)
+
+            values = {}
+            for col in df.columns:
+                if pd.api.types.is_numeric_dtype(df[col]):
+                    continue
+                distinct = df[col].dropna().astype(str).str.strip().unique()
+                if 0 < len(distinct) <= self.max_distinct:
+                    values[col] = list(distinct)
+
+            dataset = SharedDataset(key, database.uri, {
+                'columns': list(df.columns),
+                'sample_data': df.head(3).to_dict('records'),
+                'row_count': len(df),
+                'memory_bytes': int(df.memory_usage(deep=True).sum())
+            }, values)
+            with self._lock:
+                self._databases[key] = database
+                self._datasets[key] = dataset
+            return dataset
+
+    def attach(self, database: SQLiteConnectionManager, dataset: SharedDataset, table_name: str) -> str:
+        """Expose ``dataset`` as ``table_name`` on every reader of a session database.
+
+        Returns the qualified name of the shared table, as it appears in query plans.
+        """
+        return self.attach_many(database, [(dataset, table_name)])[0]
+
+    def attach_many(self, database: SQLiteConnectionManager, pairs: List[Tuple[SharedDataset, str]]) -> List[str]:
+        """``attach`` for several (dataset, table name) pairs in one setup step.
+
+        Readers apply setup steps whole, so a query never sees some of the
+        tables of a batch but not the others.
+        """
+        views = []
+        for dataset, table_name in pairs:
+            views.append((f"ds_{dataset.key[:16]}", dataset.uri, '"' + table_name.replace('"', '""') + '"'))
+
+        def setup(connection):
+            attached = [row[1] for row in connection.execute("PRAGMA database_list")]
+            for alias, uri, quoted in views:
+                if alias not in attached:
+                    connection.execute(f"ATTACH DATABASE ? AS {alias}", (uri,))
+                    attached.append(alias)
+                connection.execute(f"DROP VIEW IF EXISTS temp.{quoted}")
+                connection.execute(f"CREATE TEMP VIEW {quoted} AS SELECT * FROM {alias}.data")
+
+        database.add_setup(setup)
+        return [f"{alias}.data" for alias, _, _ in views]
+
+    def dataset_count(self) -> int:
+        with self._lock:
+            return len(self._datasets)
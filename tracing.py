@@ -0,0 +1,183 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+import requests
+
+_current_trace: ContextVar[Optional['Trace']] = ContextVar('current_trace', default=None)
+
+
+class Span:
+    """One pipeline stage: wall time plus counters (LLM tokens, rows, bytes)"""
+
+    def __init__(self, name: str, trace_id: str):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes: Dict[str, Any] = {}
+
+    def add(self, key: str, amount: float):
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    @property
+    def seconds(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+
+class Trace:
+    """Per-question trace of the analyze pipeline.
+
+    ``stage`` opens a span and makes it current for the calling context, so
+    ``record_llm`` / ``record`` calls deep inside translation or SQL
+    generation are attributed to the right stage without passing the trace
+    around. ``timings`` is the summary returned with every answer.
+    """
+
+    def __init__(self, name: str = 'analyze'):
+        self.name = name
+        self.trace_id = os.urandom(16).hex()
+        self.spans: List[Span] = []
+        self._current: Optional[Span] = None
+        self._start_ns = time.time_ns()
+
+    @contextmanager
+    def activate(self):
+        token = _current_trace.set(self)
+        try:
+            yield self
+        finally:
+            _current_trace.reset(token)
+
+    @contextmanager
+    def stage(self, name: str):
+        span = Span(name, self.trace_id)
+        outer, self._current = self._current, span
+        self.spans.append(span)
+        try:
+            yield span
+        except Exception as e:
+            span.set('error', str(e))
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            self._current = outer
+
+    def timings(self) -> Dict[str, Any]:
+        """stage -> {seconds, llm_calls, prompt_tokens, completion_tokens, rows, bytes}"""
+        summary = {}
+        for span in self.spans:
+            entry = summary.setdefault(span.name, {'seconds': 0.0})
+            entry['seconds'] = round(entry['seconds'] + span.seconds, 4)
+            for key, value in span.attributes.items():
+                if isinstance(value, (int, float)):
+                    entry[key] = entry.get(key, 0) + value
+        summary['total'] = {'seconds': round((time.time_ns() - self._start_ns) / 1e9, 4)}
+        return summary
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def record(key: str, amount: float):
+    """Add ``amount`` to counter ``key`` of the current stage, if a trace is active"""
+    trace = _current_trace.get()
+    if trace is not None and trace._current is not None:
+        trace._current.add(key, amount)
+
+
+def record_llm(result: Dict[str, Any]):
+    """Count one Ollama /api/generate response (``prompt_eval_count`` / ``eval_count``)"""
+    if not isinstance(result, dict):
+        return
+    record('llm_calls', 1)
+    record('prompt_tokens', result.get('prompt_eval_count') or 0)
+    record('completion_tokens', result.get('eval_count') or 0)
+
+
+class OTLPExporter:
+    """Ships traces as OTLP/JSON to an OpenTelemetry collector (``/v1/traces``) or a JSONL file.
+
+    Exporting runs on a background thread and never fails the request it
+    describes; problems are printed and the trace is dropped.
+    """
+
+    def __init__(self, endpoint: str = None, path: str = None, service_name: str = 'llm-data-analyst'):
+        if not endpoint and not path:
+            raise ValueError("OTLPExporter needs an endpoint or a path")
+        self.endpoint = endpoint
+        self.path = path
+        self.service_name = service_name
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional['OTLPExporter']:
+        """Exporter configured by OTEL_EXPORTER_OTLP_ENDPOINT or ANALYST_TRACE_FILE, else None"""
+        endpoint = os.environ.get('OTEL_EXPORTER_OTLP_ENDPOINT')
+        path = os.environ.get('ANALYST_TRACE_FILE')
+        if endpoint:
+            endpoint = endpoint.rstrip('/') + '/v1/traces'
+        if endpoint or path:
+            return cls(endpoint, path, os.environ.get('OTEL_SERVICE_NAME', 'llm-data-analyst'))
+        return None
+
+    def to_otlp(self, trace: Trace) -> Dict[str, Any]:
+        def value(v):
+            if isinstance(v, bool):
+                return {'boolValue': v}
+            if isinstance(v, int):
+                return {'intValue': str(v)}
+            if isinstance(v, float):
+                return {'doubleValue': v}
+            return {'stringValue': str(v)}
+
+        root_id = os.urandom(8).hex()
+        end_ns = max([span.end_ns or time.time_ns() for span in trace.spans] or [time.time_ns()])
+        spans = [{
+            'traceId': trace.trace_id,
+            'spanId': root_id,
+            'name': trace.name,
+            'kind': 1,
+            'startTimeUnixNano': str(trace._start_ns),
+            'endTimeUnixNano': str(end_ns),
+            'attributes': [],
+        }]
+        for span in trace.spans:
+            spans.append({
+                'traceId': trace.trace_id,
+                'spanId': span.span_id,
+                'parentSpanId': root_id,
+                'name': span.name,
+                'kind': 1,
+                'startTimeUnixNano': str(span.start_ns),
+                'endTimeUnixNano': str(span.end_ns or end_ns),
+                'attributes': [{'key': f"analyst.{k}", 'value': value(v)} for k, v in span.attributes.items()],
+                'status': {'code': 2, 'message': span.attributes['error']} if 'error' in span.attributes else {},
+            })
+        return {'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': self.service_name}}]},
+            'scopeSpans': [{'scope': {'name': 'analyst.tracing'}, 'spans': spans}],
+        }]}
+
+    def export(self, trace: Trace):
+        payload = self.to_otlp(trace)
+        threading.Thread(target=self._send, args=(payload,), daemon=True).start()
+
+    def _send(self, payload: Dict[str, Any]):
+        try:
+            if self.path:
+                with self._lock, open(self.path, 'a') as f:
+                    f.write(json.dumps(payload) + '\n')
+            if self.endpoint:
+                requests.post(self.endpoint, json=payload, timeout=5)
+        except Exception as e:
+            print(f"Trace export failed: {e}")
@@ -0,0 +1,122 @@
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+from metrics import CACHE_REQUESTS
+
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'llm-data-analyst', 'translation_memory.db')
+
+
+# Definite articles and politeness words, dropped from near-duplicate keys. Indefinite articles
+# ("un" is also "one"), negations and prepositions stay
+FILLER_WORDS = {
+    'the', 'please', 'el', 'la', 'los', 'las', 'le', 'les', 'l', 'der', 'die', 'das', 'den', 'dem',
+    'il', 'lo', 'gli', 'het', 'favor', 'bitte', 'favore', 'alstublieft',
+}
+
+
+def normalize_text(text: str) -> str:
+    """Case-folded, NFKC, punctuation-free, single-spaced; works for any script"""
+    text = unicodedata.normalize('NFKC', str(text)).casefold()
+    return ' '.join(re.sub(r'[^\w]+', ' ', text).split())
+
+
+def near_duplicate_key(key: str) -> str:
+    """Sorted content words and numbers of a normalized text, ignoring fillers and word order"""
+    return ' '.join(sorted(word for word in key.split() if word not in FILLER_WORDS))
+
+
+class TranslationMemory:
+    """Persistent cache of translations keyed by (source, target, normalized text).
+
+    Besides exact hits on the normalized text, a lookup matches a stored text
+    with the same multiset of content words and numbers ("ventas en Asia" /
+    "las ventas en Asia?" / "en Asia, ventas"). Any changed word is a miss,
+    so "sales in Asia" / "sales in India" and "highest" / "lowest" never
+    share a translation. Entries live in SQLite so they survive restarts and
+    the least recently used are evicted beyond ``max_entries``; recency from
+    lookups is written out with the next ``store``.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, max_entries: int = 5000):
+        self.path = path
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # (source, target, key) -> translation, least recently used first
+        self._near = {}     # (source, target, near-duplicate key) -> entry in _entries
+        self._used = {}     # entry -> clock of lookups not yet written to the database
+        self._lock = threading.Lock()
+
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""CREATE TABLE IF NOT EXISTS translations (
+            source TEXT, target TEXT, key TEXT, translation TEXT, used INTEGER,
+            PRIMARY KEY (source, target, key))""")
+        for source, target, key, translation in self._db.execute(
+                "SELECT source, target, key, translation FROM translations ORDER BY used"):
+            self._add((source, target, key), translation)
+        self._clock = len(self._entries)
+
+    def _add(self, entry: tuple, translation: str):
+        self._entries[entry] = translation
+        self._entries.move_to_end(entry)
+        source, target, key = entry
+        near = near_duplicate_key(key)
+        if near:
+            self._near[(source, target, near)] = entry
+
+    def _remove(self, entry: tuple):
+        del self._entries[entry]
+        self._used.pop(entry, None)
+        source, target, key = entry
+        near = (source, target, near_duplicate_key(key))
+        if self._near.get(near) == entry:
+            del self._near[near]
+
+    def lookup(self, source: str, target: str, text: str) -> Optional[str]:
+        key = normalize_text(text)
+        if not key:
+            return None
+        with self._lock:
+            entry = (source, target, key)
+            if entry not in self._entries:
+                near = near_duplicate_key(key)
+                entry = self._near.get((source, target, near)) if near else None
+            if entry is None:
+                CACHE_REQUESTS.inc(cache='translation', result='miss')
+                return None
+            # Recency stays in memory until the next store; a crash only loses LRU order
+            self._entries.move_to_end(entry)
+            self._clock += 1
+            self._used[entry] = self._clock
+            CACHE_REQUESTS.inc(cache='translation', result='hit')
+            return self._entries[entry]
+
+    def store(self, source: str, target: str, text: str, translation: str):
+        key = normalize_text(text)
+        if not key or not translation:
+            return
+        with self._lock:
+            entry = (source, target, key)
+            if entry in self._entries:
+                self._remove(entry)
+            self._add(entry, translation)
+            self._clock += 1
+            self._db.execute("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?)",
+                             (*entry, translation, self._clock))
+            while len(self._entries) > self.max_entries:
+                evicted = next(iter(self._entries))
+                self._remove(evicted)
+                self._db.execute("DELETE FROM translations WHERE source = ? AND target = ? AND key = ?", evicted)
+            self._db.executemany("UPDATE translations SET used = ? WHERE source = ? AND target = ? AND key = ?",
+                                 [(used, *entry) for entry, used in self._used.items()])
+            self._used.clear()
+            self._db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
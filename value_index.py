@@ -0,0 +1,134 @@
+import re
+import difflib
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+
+def normalize(text: str) -> str:
+    """Lowercase and collapse everything but letters and digits to single spaces"""
+    return ' '.join(re.sub(r'[^0-9a-z]+', ' ', str(text).lower()).split())
+
+
+class ValueIndex:
+    """In-memory dictionary of categorical values for grounding filters.
+
+    Distinct values of every low-cardinality text column are kept in one
+    sorted array of normalized keys, so exact lookups are a bisect and fuzzy
+    lookups only compare against keys sharing a short prefix.
+    """
+
+    def __init__(self, max_distinct: int = 50, max_words: int = 4, fuzzy_cutoff: float = 0.8):
+        self.max_distinct = max_distinct
+        self.max_words = max_words
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.keys = []      # sorted normalized values
+        self.entries = []   # (table, column, value) aligned with self.keys
+
+    def add_table(self, table_name: str, df: pd.DataFrame):
+        """Index the distinct values of the low-cardinality text columns of ``df``"""
+        self.remove_table(table_name)
+        for col in df.columns:
+            if pd.api.types.is_numeric_dtype(df[col]):
+                continue
+            distinct = df[col].dropna().astype(str).str.strip().unique()
+            if 0 < len(distinct) <= self.max_distinct:
+                self.add_column(table_name, col, distinct)
+
+    def add_column(self, table_name: str, column: str, values):
+        pairs = list(zip(self.keys, self.entries))
+        for value in values:
+            key = normalize(value)
+            if key:
+                pairs.append((key, (table_name, column, str(value))))
+        pairs.sort(key=lambda pair: pair[0])
+        self.keys = [key for key, _ in pairs]
+        self.entries = [entry for _, entry in pairs]
+
+    def remove_table(self, table_name: str):
+        kept = [(k, e) for k, e in zip(self.keys, self.entries) if e[0] != table_name]
+        self.keys = [k for k, _ in kept]
+        self.entries = [e for _, e in kept]
+
+    def values_for(self, table_name: str) -> Dict[str, List[str]]:
+        """Column -> sorted distinct values for one table"""
+        values = {}
+        for _, (table, column, value) in zip(self.keys, self.entries):
+            if table == table_name:
+                values.setdefault(column, []).append(value)
+        return {column: sorted(vals) for column, vals in values.items()}
+
+    def _exact(self, key: str) -> List[Tuple[str, str, str]]:
+        i = bisect_left(self.keys, key)
+        found = []
+        while i < len(self.keys) and self.keys[i] == key:
+            found.append(self.entries[i])
+            i += 1
+        return found
+
+    def _fuzzy(self, key: str) -> List[Tuple[str, str, str]]:
+        if len(key) < 5:
+            return []  # short words ("many" ~ "May") are too easy to confuse
+        prefix = key[:1]
+        i = bisect_left(self.keys, prefix)
+        best, best_ratio = [], self.fuzzy_cutoff
+        while i < len(self.keys) and self.keys[i].startswith(prefix):
+            ratio = difflib.SequenceMatcher(None, key, self.keys[i]).ratio()
+            if ratio > best_ratio:
+                best, best_ratio = [self.entries[i]], ratio
+            elif ratio == best_ratio and best:
+                best.append(self.entries[i])
+            i += 1
+        return best
+
+    def lookup(self, text: str, table_name: Optional[str] = None) -> List[Tuple[int, int, str, str, str]]:
+        """Map question tokens to exact column/value pairs.
+
+        Returns (start, end, table, column, value) tuples where start/end are
+        character offsets into ``normalize(text)``. Longer phrases win over the
+        words they contain; a phrase matching several columns yields one tuple
+        per column so callers can detect the ambiguity.
+        """
+        words = normalize(text).split()
+        offsets, pos = [], 0
+        for word in words:
+            offsets.append(pos)
+            pos += len(word) + 1
+
+        used = [False] * len(words)
+        matches = []
+        for size in range(min(self.max_words, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                if any(used[start:start + size]):
+                    continue
+                phrase = ' '.join(words[start:start + size])
+                candidates = self._exact(phrase)
+                if not candidates and phrase.endswith('s'):
+                    candidates = self._exact(phrase[:-1])
+                if not candidates:
+                    candidates = self._fuzzy(phrase)
+                if table_name:
+                    candidates = [c for c in candidates if c[0] == table_name]
+                if not candidates:
+                    continue
+                for i in range(start, start + size):
+                    used[i] = True
+                begin = offsets[start]
+                for table, column, value in candidates:
+                    matches.append((begin, begin + len(phrase), table, column, value))
+        return sorted(matches)
+
+    def prompt_hints(self, *texts: str) -> str:
+        """Prompt section listing only the values the question refers to"""
+        seen = []
+        for text in texts:
+            if not text:
+                continue
+            for _, _, table, column, value in self.lookup(text):
+                if (table, column, value) not in seen:
+                    seen.append((table, column, value))
+        if not seen:
+            return ""
+        lines = [f"- {table}.{column} = '{value}'" for table, column, value in seen]
+        return "MATCHING VALUES (use these exact literals in filters):\n" + "\n".join(lines) + "\n"
@@ -1,8 +1,16 @@
 import streamlit as st
 import pandas as pd
 from data_analyst_mysql import DataAnalystAssistant
+from table_store import SharedTableStore
+from metrics import start_metrics_server
+from model_warmup import WarmupManager
+from translation_memory import TranslationMemory, DEFAULT_PATH as TRANSLATION_MEMORY_PATH
+from example_store import ExampleStore, DEFAULT_PATH as EXAMPLE_STORE_PATH
+from excel_reader import EXCEL_EXTENSIONS, workbook_sheets
 from enhanced_visualizer import EnhancedVisualizer
+from concurrent.futures import ThreadPoolExecutor
 import os
+import time
 
 st.set_page_config(page_title="Data Analyst Assistant", layout="wide")
 
@@ -56,6 +64,58 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+def run_analysis(assistant, question, previous=None):
+    """Run analyze in a worker thread so the running query can be cancelled from the UI"""
+    worker = ThreadPoolExecutor(max_workers=1)
+    future = worker.submit(assistant.analyze, question, previous)
+    cancel_slot = st.empty()
+    cancel_slot.button("⏹ Cancel query", on_click=assistant.cancel_query)
+    status = st.empty()
+    started = time.time()
+    try:
+        while not future.done():
+            status.caption(f"Running for {time.time() - started:.0f}s...")
+            time.sleep(0.25)
+    finally:
+        # Streamlit stops this script on any interaction (including Cancel); stop the query with it
+        if not future.done():
+            assistant.cancel_query()
+        worker.shutdown(wait=False)
+    cancel_slot.empty()
+    status.empty()
+    return future.result()
+
+@st.cache_resource
+def get_table_store():
+    """One table store per server process, shared by every session"""
+    return SharedTableStore()
+
+@st.cache_resource
+def get_translation_memory():
+    """Translation memory shared by every session"""
+    return TranslationMemory(os.environ.get('ANALYST_TRANSLATION_MEMORY', TRANSLATION_MEMORY_PATH))
+
+@st.cache_resource
+def get_example_store():
+    """Accepted question/SQL examples shared by every session"""
+    return ExampleStore(os.environ.get('ANALYST_EXAMPLE_STORE', EXAMPLE_STORE_PATH))
+
+@st.cache_resource
+def get_metrics_server():
+    """Prometheus /metrics on a side port, started once per server process"""
+    return start_metrics_server(int(os.environ.get('ANALYST_METRICS_PORT', 9464)))
+
+@st.cache_resource
+def get_warmup_manager(ollama_url: str):
+    """Preload models once per server process and keep them resident in Ollama"""
+    models = [m.strip() for m in os.environ.get('ANALYST_WARM_MODELS', 'llama3').split(',') if m.strip()]
+    return WarmupManager(ollama_url, models, keep_alive=os.environ.get('ANALYST_KEEP_ALIVE', '30m')).start()
+
+table_store = get_table_store()
+translation_memory = get_translation_memory()
+example_store = get_example_store()
+get_metrics_server()
+
 # Initialize session state
 if 'assistant' not in st.session_state:
     st.session_state.assistant = None
@@ -73,6 +133,22 @@ with st.sidebar:
     # Ollama URL
     ollama_url = st.text_input("Ollama URL", value="http://localhost:11434")
     
+    combined_multilingual = st.checkbox(
+        "Fast multilingual mode", value=False,
+        help="Non-English questions use one LLM call for language + SQL and one for insights in that language"
+    )
+    
+    # Model readiness (preloading starts with the app, not with the first question)
+    warmup = get_warmup_manager(ollama_url)
+    for model, info in warmup.status().items():
+        state = info.get('state')
+        if state == 'ready':
+            st.caption(f"🟢 {model} ready" + (f" (loaded in {info['load_seconds']:.1f}s)" if 'load_seconds' in info else ""))
+        elif state == 'error':
+            st.caption(f"🔴 {model} unavailable: {info.get('error')}")
+        else:
+            st.caption(f"🟡 {model} loading...")
+    
     st.subheader("MySQL Database")
     mysql_host = st.text_input("MySQL Host", value="localhost")
     mysql_port = st.number_input("MySQL Port", value=3306)
@@ -92,13 +168,22 @@ with st.sidebar:
                     'password': mysql_password,
                     'database': mysql_database
                 }
-                st.session_state.assistant = DataAnalystAssistant(ollama_url, mysql_config)
+                assistant = DataAnalystAssistant(ollama_url, mysql_config, table_store=table_store, translation_memory=translation_memory,
+                                                 example_store=example_store)
+                if st.session_state.assistant:
+                    st.session_state.assistant.close()
+                st.session_state.assistant = assistant
                 st.success("Connected to MySQL and initialized assistant!")
             except Exception as e:
                 st.error(f"Failed to connect: {str(e)}")
     
+    if st.session_state.assistant and st.session_state.assistant.engine:
+        with st.expander("Connection Pool"):
+            st.json(st.session_state.assistant.pool_status())
+    
     if st.button("Work with Files Only") and not st.session_state.assistant:
-        st.session_state.assistant = DataAnalystAssistant(ollama_url)
+        st.session_state.assistant = DataAnalystAssistant(ollama_url, table_store=table_store, translation_memory=translation_memory,
+                                                          example_store=example_store)
         st.success("Assistant initialized for file-only mode!")
     
     st.header("Upload Data")
@@ -112,29 +197,84 @@ with st.sidebar:
     
     if uploaded_files:
         if not st.session_state.assistant:
-            st.session_state.assistant = DataAnalystAssistant(ollama_url)
+            st.session_state.assistant = DataAnalystAssistant(ollama_url, table_store=table_store, translation_memory=translation_memory,
+                                                              example_store=example_store)
             st.info("Assistant auto-initialized for file uploads")
         
+        batch = []      # (file name, content, table name[, sheet, columns]) per upload, in upload order
+        batch_blocked = None
         for file in uploaded_files:
-            # Save uploaded file temporarily
-            temp_path = f"temp_{file.name}"
-            with open(temp_path, "wb") as f:
-                f.write(file.getbuffer())
-            
-            # Load into assistant
             table_name = st.text_input(f"Table name for {file.name}", 
                                      value=os.path.splitext(file.name)[0])
+            incremental, key_column = False, None
+            if st.session_state.assistant.engine and table_name in st.session_state.assistant.tables:
+                # Re-upload of a refreshed export: write only new/changed rows
+                incremental = st.checkbox(f"Only load new or changed rows of {table_name}", value=True)
+                key_column = st.text_input(f"Key column for {file.name} (optional)").strip() or None
+            sheets, columns = None, None
+            if os.path.splitext(file.name)[1].lower() in EXCEL_EXTENSIONS:
+                try:
+                    available = workbook_sheets(file.getbuffer())
+                    sheets = st.multiselect(f"Sheets of {file.name}", available, default=available[:1])
+                except Exception as e:
+                    st.error(f"Cannot read {file.name}: {str(e)}")
+                columns = [col.strip() for col in st.text_input(
+                    f"Columns to load from {file.name} (optional, comma-separated)").split(',') if col.strip()] or None
+            
+            batch.append((file.name, file.getbuffer(), table_name) + ((sheets[0], columns) if sheets else ()))
+            if incremental:
+                batch_blocked = f"{file.name} is set to load only new or changed rows; load it on its own"
+            elif sheets is not None and len(sheets) != 1:
+                batch_blocked = f"Select exactly one sheet of {file.name} to load it with the others"
             
             if st.button(f"Load {file.name}"):
                 try:
-                    result = st.session_state.assistant.load_file(temp_path, table_name)
+                    if sheets is not None and not incremental:
+                        # Each selected sheet becomes a table; sheets parse in parallel
+                        result = "\n\n".join(st.session_state.assistant.load_workbook(
+                            file.getbuffer(), sheets, columns, table_name, file.name))
+                    elif st.session_state.assistant.engine:
+                        # Parsed straight from the upload buffer, no temp file
+                        result = st.session_state.assistant.load_file(file.getbuffer(), table_name, incremental,
+                                                                      key_column, file_name=file.name,
+                                                                      sheet=sheets[0] if sheets else 0, columns=columns)
+                    else:
+                        # Parsed once per distinct file across all sessions
+                        dataset = table_store.get_or_load(file.getbuffer(), file.name)
+                        result = st.session_state.assistant.attach_dataset(dataset, table_name)
                     st.success(result)
-                    os.remove(temp_path)  # Clean up
                 except Exception as e:
                     st.error(f"Error loading file: {str(e)}")
+        
+        names = [upload[2] for upload in batch]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            batch_blocked = f"Give each file its own table name (used more than once: {', '.join(duplicates)})"
+        if len(uploaded_files) > 1 and batch_blocked:
+            st.caption(f"Load all is unavailable: {batch_blocked}")
+        if len(uploaded_files) > 1 and st.button(f"Load all {len(uploaded_files)} files", disabled=bool(batch_blocked)):
+            # Parsed concurrently straight from the upload buffers; tables appear together
+            bar = st.progress(0.0, text="Parsing files...")
+            lines = {name: st.empty() for name in names}
+            parsed = []
+            
+            def show_progress(table_name, ok, message):
+                parsed.append(table_name)
+                bar.progress(len(parsed) / len(uploaded_files), text=f"Parsed {len(parsed)} of {len(uploaded_files)} files")
+                (lines[table_name].caption if ok else lines[table_name].error)(message)
+            
+            try:
+                outcomes = st.session_state.assistant.load_uploads(batch, progress=show_progress)
+                for table_name, (ok, message) in outcomes.items():
+                    (lines[table_name].success if ok else lines[table_name].error)(message)
+            except Exception as e:
+                st.error(f"Error loading files: {str(e)}")
+            bar.empty()
 
 # Main interface
 if st.session_state.assistant:
+    st.session_state.assistant.combined_multilingual = combined_multilingual
+    
     # Show available tables
     if st.session_state.assistant.tables:
         st.subheader("Available Tables")
@@ -167,7 +307,7 @@ if st.session_state.assistant:
     st.subheader("Ask Questions About Your Data")
     
     # Display chat history
-    for chat in st.session_state.chat_history:
+    for index, chat in enumerate(st.session_state.chat_history):
         with st.chat_message("user"):
             st.write(chat['question'])
         
@@ -181,14 +321,17 @@ if st.session_state.assistant:
                     
                     # Show table results right after insights
                     st.dataframe(results_df)
+                    if chat.get('truncated'):
+                        st.caption(f"Showing the first {len(results_df):,} of {chat['row_count']:,} rows; the chart uses a sample of all rows.")
+                    chart_df = pd.DataFrame(chat['chart_data']) if chat.get('chart_data') else results_df
                     
                     # Clean data summary
-                    data_summary = st.session_state.visualizer.get_chart_summary(results_df)
+                    data_summary = st.session_state.visualizer.get_chart_summary(chart_df)
                     st.info(data_summary)
                     
                     # Create and display chart
                     chart = st.session_state.visualizer.create_visualization(
-                        chat['question'], chat['sql_query'], results_df
+                        chat['question'], chat['sql_query'], chart_df
                     )
                     if chart:
                         st.markdown('<div class="chart-container">', unsafe_allow_html=True)
@@ -206,6 +349,10 @@ if st.session_state.assistant:
                             st.write("**Sample Data:**")
                             st.dataframe(results_df.head(3))
                         
+                        if chat.get('timings'):
+                            st.write("**Stage Timings:**")
+                            st.dataframe(pd.DataFrame(chat['timings']).T.fillna(0))
+                        
                         # Generated Plotly code
                         st.write("**Generated Plotly Code:**")
                         plotly_code = st.session_state.visualizer.generate_plotly_code(
@@ -220,6 +367,15 @@ if st.session_state.assistant:
                 
                 with st.expander("View SQL Query"):
                     st.code(chat['sql_query'], language='sql')
+                
+                # Accepted answers become few-shot examples for similar questions
+                if chat.get('accepted'):
+                    st.caption("👍 Saved as an example for similar questions")
+                elif st.button("👍 Correct answer", key=f"accept_{index}",
+                               help="Use this question and SQL as an example for similar questions"):
+                    chat['accepted'] = st.session_state.assistant.accept_result(chat)
+                    if not chat['accepted']:
+                        st.caption("Follow-ups and fallback guesses can't be saved as examples")
             else:
                 st.error(chat['error'])
     
@@ -232,7 +388,9 @@ if st.session_state.assistant:
         
         with st.chat_message("assistant"):
             with st.spinner("Analyzing..."):
-                result = st.session_state.assistant.analyze(question)
+                # Follow-ups ("now only for Asia") refine the last successful answer
+                previous = next((chat for chat in reversed(st.session_state.chat_history) if chat['success']), None)
+                result = run_analysis(st.session_state.assistant, question, previous)
                 st.session_state.chat_history.append(result)
                 
                 if result['success']:
@@ -244,14 +402,17 @@ if st.session_state.assistant:
                         
                         # Show table results right after insights
                         st.dataframe(results_df)
+                        if result.get('truncated'):
+                            st.caption(f"Showing the first {len(results_df):,} of {result['row_count']:,} rows; the chart uses a sample of all rows.")
+                        chart_df = pd.DataFrame(result['chart_data']) if result.get('chart_data') else results_df
                         
                         # Clean data summary
-                        data_summary = st.session_state.visualizer.get_chart_summary(results_df)
+                        data_summary = st.session_state.visualizer.get_chart_summary(chart_df)
                         st.info(data_summary)
                         
                         # Create and display chart
                         chart = st.session_state.visualizer.create_visualization(
-                            question, result['sql_query'], results_df
+                            question, result['sql_query'], chart_df
                         )
                         if chart:
                             st.markdown('<div class="chart-container">', unsafe_allow_html=True)
@@ -269,6 +430,10 @@ if st.session_state.assistant:
                                 st.write("**Sample Data:**")
                                 st.dataframe(results_df.head(3))
                             
+                            if result.get('timings'):
+                                st.write("**Stage Timings:**")
+                                st.dataframe(pd.DataFrame(result['timings']).T.fillna(0))
+                            
                             # Generated Plotly code
                             st.write("**Generated Plotly Code:**")
                             plotly_code = st.session_state.visualizer.generate_plotly_code(